@@ -0,0 +1,171 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from cache import sizeof
+
+OVERALL = "Overall"
+# Time windows kept per chat, most recently used first out
+MAX_WINDOWS = 8
+
+
+def time_bounds(timestamps, start=None, end=None):
+    # Positions lo:hi of the rows with start <= timestamp < end in sorted datetime64 values,
+    # found by binary search; None leaves that side open
+    lo = 0 if start is None else int(np.searchsorted(timestamps, np.datetime64(pd.Timestamp(start)), side='left'))
+    hi = len(timestamps) if end is None else int(np.searchsorted(timestamps, np.datetime64(pd.Timestamp(end)), side='left'))
+    return lo, max(lo, hi)
+
+
+def time_slice(data, start=None, end=None):
+    # The rows of data from start (inclusive) to end (exclusive), by their 'timestamp' column
+    if start is None and end is None:
+        return data
+    if not data['timestamp'].is_monotonic_increasing:
+        data = data.sort_values('timestamp', kind='stable')
+    lo, hi = time_bounds(data['timestamp'].to_numpy(), start, end)
+    return data.iloc[lo:hi]
+
+
+class AnalysisIndex:
+    # Built once per chat after preprocessing: the row positions of every user plus the grouped
+    # counts behind the helper timelines and activity maps, for every user and "Overall". The
+    # helper functions look these up instead of rescanning the full frame with data['user'] == x.
+    # Rows are kept in time order, so window(start, end) narrows all of it to a time range with
+    # two binary searches.
+
+    def __init__(self, data, rows=None, on_grow=None):
+        if not data['timestamp'].is_monotonic_increasing:
+            data = data.sort_values('timestamp', kind='stable')
+        self.data = data
+        self.timestamps = data['timestamp'].to_numpy()
+
+        if rows is None:
+            # One stable sort of the user codes gives each user a contiguous run of row positions,
+            # in time order within the run
+            user = pd.Categorical(data['user']).remove_unused_categories()
+            codes = user.codes
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(user.categories) + 1))
+            rows = {name: order[bounds[i]:bounds[i + 1]] for i, name in enumerate(user.categories)}
+        self._rows = rows
+
+        user_counts = data['user'].value_counts()
+        self.user_counts = user_counts[user_counts > 0]
+        # Per-user results computed on first use (grouped counts, token counts, emoji counts, ...)
+        self._derived = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._windows = OrderedDict()
+        # Called with the bytes this index gains (or, negative, frees) after it was built, as it
+        # memoizes results and windows, so that a cache holding it can keep its size up to date
+        self.on_grow = on_grow
+        self._grown = 0
+
+    def _grow(self, size):
+        with self._lock:
+            self._grown += size
+        if self.on_grow is not None:
+            self.on_grow(size)
+
+    # Grouped counts per user and "Overall", each computed on first use
+    @property
+    def daily(self):
+        return self.derived('counts', 'daily', lambda: self._counts(['date']))
+
+    @property
+    def monthly(self):
+        return self.derived('counts', 'monthly', lambda: self._counts(['year', 'month']))
+
+    @property
+    def weekday(self):
+        return self.derived('counts', 'weekday', lambda: self._counts(['day_name']))
+
+    @property
+    def month(self):
+        return self.derived('counts', 'month', lambda: self._counts(['month']))
+
+    @property
+    def week_period(self):
+        return self.derived('counts', 'week_period', lambda: self._counts(['day_name', 'period']))
+
+    def _counts(self, keys):
+        data = self.data
+        counts = {OVERALL: data.groupby(keys, observed=True).size()}
+        per_user = data.groupby(['user'] + keys, observed=True).size()
+        for name, group in per_user.groupby(level=0, observed=True):
+            counts[name] = group.droplevel(0)
+        # Users without messages in a time window get an empty table
+        for name in self._rows:
+            counts.setdefault(name, counts[OVERALL].iloc[:0])
+        return counts
+
+    @property
+    def users(self):
+        return list(self._rows)
+
+    @property
+    def nbytes(self):
+        return int(self.data.memory_usage(deep=True).sum()) + self._own_bytes() + self._grown
+
+    def _own_bytes(self):
+        # What a window adds to its parent: the frame is a slice of the parent's
+        return sum(rows.nbytes for rows in self._rows.values()) + sizeof(self.user_counts)
+
+    def derived(self, name, user, compute):
+        # Threads asking for the same value wait for the first one to compute it
+        key = (name, user)
+        with self._lock:
+            if key in self._derived:
+                return self._derived[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self._derived:
+                value = compute()
+                self._derived[key] = value
+                self._grow(sizeof(value))
+        return self._derived[key]
+
+    def rows(self, user):
+        return self._rows.get(user, np.empty(0, dtype=np.intp))
+
+    def frame(self, user):
+        # The rows of one user in O(rows of that user); "Overall" is the indexed frame itself
+        if user == OVERALL:
+            return self.data
+        return self.data.take(self.rows(user))
+
+    def window(self, start=None, end=None):
+        # The index of the messages from start (inclusive) to end (exclusive). The frame is a
+        # slice of this one and each user's rows are cut out of theirs with a binary search, so
+        # this is O(users * log(rows)); the grouped counts and per-user results of the window are
+        # computed when first asked for, and the last MAX_WINDOWS windows are kept.
+        lo, hi = time_bounds(self.timestamps, start, end)
+        if lo == 0 and hi == len(self.timestamps):
+            return self
+        with self._lock:
+            window = self._windows.get((lo, hi))
+            if window is not None:
+                self._windows.move_to_end((lo, hi))
+                return window
+        rows = {}
+        for name, positions in self._rows.items():
+            first, last = np.searchsorted(positions, [lo, hi])
+            rows[name] = positions[first:last] - lo
+        window = AnalysisIndex(self.data.iloc[lo:hi], rows)
+        evicted = []
+        with self._lock:
+            added = self._windows.setdefault((lo, hi), window) is window
+            window = self._windows[(lo, hi)]
+            while len(self._windows) > MAX_WINDOWS:
+                evicted.append(self._windows.popitem(last=False)[1])
+        # A window's memoized results count towards this index's size while it is kept
+        if added:
+            window.on_grow = self._grow
+            self._grow(window._own_bytes())
+        for old in evicted:
+            old.on_grow = None
+            self._grow(-(old._own_bytes() + old._grown))
+        return window
@@ -1,37 +1,192 @@
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import streamlit as st
 import preprocessor
+import binning
 import helper
+import sentiment
+import cache
+import store
+import instrumentation
+import rendering
+import multichat
+import conversation
+from analysis_index import AnalysisIndex
 import pandas as pd
-import plotly.express as px
-import plotly.figure_factory as ff
-import nltk
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
-import plotly.graph_objects as go
-import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt
-import advertools as adv
-import plotly.graph_objects as go
-
-# Download the VADER lexicon (run only once)
-nltk.download('vader_lexicon')
-
-# Initialize the VADER sentiment analyzer
-sid = SentimentIntensityAnalyzer()
-
-# Map VADER sentiment score to sentiment categories
-
-def map_sentiment(score):
-    if score >= 0.5:
-        return "Very Positive"
-    elif score >= 0.1:
-        return "Positive"
-    elif score >= -0.1:
-        return "Neutral"
-    elif score >= -0.5:
-        return "Negative"
+
+# Plotting libraries, the word cloud, URLExtract and the VADER lexicon are loaded the first time
+# their section renders. Set WA_PROFILE_STARTUP=1 to see what each import costs, and
+# WA_PROFILE_MEMORY=1 to add peak memory to the Performance panel (tracemalloc, slower).
+ANALYSIS_THREADS = int(os.environ.get("WA_ANALYSIS_THREADS", "4"))
+
+
+@st.cache_resource
+def get_import_profile():
+    added, _ = instrumentation.import_profile()
+    return added
+
+
+@st.cache_resource
+def get_executor():
+    # Worker threads for the slow analysis sections, shared by every session
+    return ThreadPoolExecutor(max_workers=ANALYSIS_THREADS, thread_name_prefix="analysis")
+
+
+@st.cache_resource
+def get_chat_cache():
+    # One memory-bounded cache shared by every session on this server
+    return cache.ChatCache()
+
+
+def load_chat(uploaded_file, incremental=False):
+    if incremental:
+        # Only messages added since the last upload of this file name are parsed and scored
+        df, _ = store.ingest(uploaded_file.name, uploaded_file.getvalue(), compact=True)
+    else:
+        # Parse the upload line by line instead of decoding it into one big string, into
+        # categorical / small-integer columns
+        uploaded_file.seek(0)
+        with instrumentation.stage("preprocessor.preprocess_stream") as record:
+            df = pd.concat(preprocessor.preprocess_stream(uploaded_file, compact=True), ignore_index=True)
+            record["rows"] = len(df)
+        df = preprocessor.compact_schema(df)
+
+        # Perform sentiment analysis using VADER (deduplicated, cached on disk) and add the results to the DataFrame
+        df['Sentiment Score'] = sentiment.compound_scores(df)
+
+    # Map sentiment scores to sentiment categories
+    with instrumentation.stage("binning.sentiment_labels", len(df)):
+        df['Sentiment'] = binning.sentiment_labels(df['Sentiment Score'])
+    return df
+
+
+def analysis(func, *args):
+    # helper results only change with the upload, the arguments and the date range, so reruns
+    # reuse them
+    return chats.get_or_compute(chat_key, (func.__name__,) + args + (start, end),
+                                lambda: func(*args, df, index=index, start=start, end=end))
+
+
+def comparison(func):
+    # Like analysis(), for the combined frame of the compare mode
+    return chats.get_or_compute(combined_key, (func.__name__,), lambda: func(combined))
+
+
+def submit(func, *args):
+    # analysis() in a worker thread, in a copy of this rerun's context so its stages still reach
+    # the Performance panel. The thread only computes; all st.* calls stay on the script thread.
+    frame, chat_index, key, window = df, index, chat_key, {"start": start, "end": end}
+
+    def task():
+        return chats.get_or_compute(key, (func.__name__,) + args + (window["start"], window["end"]),
+                                    lambda: func(*args, frame, index=chat_index, **window))
+
+    return get_executor().submit(contextvars.copy_context().run, task)
+
+
+def show_stats(stats):
+    num_messages, words, num_media_messages, num_links = stats
+    with st.expander("View Data"):
+        col1, col2, col3, col4 = st.columns(4)
+
+        with col1:
+            st.metric("Total Messages", num_messages)
+        with col2:
+            st.metric("Total Words", words)
+        with col3:
+            st.metric("Media Shared", num_media_messages)
+        with col4:
+            st.metric("Links Shared", num_links)
+
+
+def show_common_words(most_common_df):
+    import plotly.express as px
+    if most_common_df.empty:
+        st.caption("No words to count")
+        return
+    fig = px.bar(
+        most_common_df,
+        x=1,  # Frequency column
+        y=0,  # Word column
+        title="Most Common Words",
+        orientation="h",
+        labels={1: "Frequency", 0: "Word"},  # Corrected column names
+        template = "plotly_dark",
+    )
+    fig.update_xaxes(title="Frequency")
+    fig.update_yaxes(title="Word")
+    plotly_chart(fig,use_container_width=True, height = 200)
+
+
+def show_emoji(emoji_df):
+    import plotly.express as px
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.subheader("Emoji Analysis Data")
+        st.dataframe(emoji_df.style.background_gradient(cmap="Blues"), height=500, width=1000, use_container_width=True)
+        st.download_button("Download Data", data = csv, file_name = "Emoji.csv", mime = "text/csv",
+                    help = 'Click here to download the data as a CSV file')
+
+    with col2:
+        st.subheader("Emoji Analysis Chart")
+        fig = px.pie(
+            emoji_df.head(),
+            values='count',
+            names='emoji',
+            hole=0.5,
+            template = "seaborn",
+        )
+        plotly_chart(fig,use_container_width=True, height = 200)
+
+
+def show_sentiment(sentiment_counts):
+    import plotly.express as px
+    col1, col2 = st.columns(2)
+
+    with col1:
+        fig = px.pie(
+            names=sentiment_counts['Sentiment'],
+            values=sentiment_counts['Counts'],
+            title="Sentiment Distribution Monthly",
+            hole=0.5,
+            template="seaborn",
+        )
+
+        plotly_chart(fig, use_container_width=False)
+
+    with col2:
+        st.subheader("Message Sentiment Chart month-year wise")
+        st.dataframe(sentiment_counts.style.background_gradient(cmap="Blues"), use_container_width=True)
+    # Create a line chart for sentiment counts by formatted month and year
+
+    fig = px.line(
+        sentiment_counts,
+        x='month_year',
+        y='Counts',
+        color='Sentiment',
+        title="Sentiment Counts by Month and Year",
+        labels={'Counts': 'Count'},
+        template="seaborn",
+    )
+
+    plotly_chart(fig, use_container_width=True)
+
+
+def show_word_cloud(png):
+    if png is None:
+        st.caption("No words to draw a word cloud from")
     else:
-        return "Very Negative"
+        st.image(png)
+
+
+def plotly_chart(fig, **kwargs):
+    # Plotly serializes the figure here, so it is timed as a stage of its own
+    with instrumentation.stage(f"plotly_chart: {fig.layout.title.text or fig.data[0].type}"):
+        st.plotly_chart(fig, **kwargs)
+
 
 # Set Streamlit page configuration
 st.set_page_config(
@@ -40,31 +195,153 @@ st.set_page_config(
     layout="wide",
 )
 st.title(" :bar_chart: WhatsApp Chat Analyzer")
+# Stage timings of this rerun, shown in the Performance panel at the bottom
+recorder = instrumentation.start_recording(trace_memory=bool(os.environ.get("WA_PROFILE_MEMORY")))
 
 # Removed the sidebar code
-
+if os.environ.get("WA_PROFILE_STARTUP"):
+    with st.sidebar.expander("Startup profile", expanded=True):
+        st.caption("Time each import adds on a cold start, measured in a fresh interpreter")
+        st.dataframe(get_import_profile(), use_container_width=True)
+
+compare_mode = st.checkbox(
+    "Compare chats",
+    key="compare-mode",
+    help="Upload several exported chats and compare their activity side by side",
+)
 # Uploaded file handling
-uploaded_file = st.file_uploader(
-    "Upload Your WhatsApp Group Exported (without Media) txt file", type="txt"
+if compare_mode:
+    uploaded_files = st.file_uploader(
+        "Upload the WhatsApp Group Exported (without Media) txt files to compare", type="txt", accept_multiple_files=True
+    )
+    uploaded_file = None
+else:
+    uploaded_file = st.file_uploader(
+        "Upload Your WhatsApp Group Exported (without Media) txt file", type="txt"
+    )
+incremental = st.checkbox(
+    "Incremental ingest",
+    help="Keep a processed copy of this chat on disk and, when the same export file is uploaded again, only process the new messages",
 )
 
-if uploaded_file is not None:
+if compare_mode and uploaded_files:
     try:
-        # To read file as bytes:
-        bytes_data = uploaded_file.read()
-        data = bytes_data.decode("utf-8")
-        df = preprocessor.preprocess(data)
-
-        # Perform sentiment analysis using VADER and add the results to the DataFrame
-        df['Sentiment Score'] = df['message'].apply(lambda x: sid.polarity_scores(x)['compound'])
+        import plotly.express as px
+
+        chats = get_chat_cache()
+        frames = {}
+        chat_keys = []
+        for name, upload in zip(multichat.chat_names([upload.name for upload in uploaded_files]), uploaded_files):
+            with instrumentation.stage("upload_key"):
+                key = cache.upload_key(upload.getvalue())
+            with instrumentation.stage("load_chat"):
+                frames[name] = chats.get_or_compute(key, ("frame", incremental), lambda: load_chat(upload, incremental))
+            chat_keys.append(f"{name}:{key}")
+        # All chats in one frame with a categorical chat_id; every chart below is one groupby over it
+        combined_key = cache.upload_key("\n".join(chat_keys).encode("utf-8"))
+        combined = chats.get_or_compute(combined_key, "combined", lambda: multichat.combine(frames))
+
+        st.title("Chat Comparison")
+        st.dataframe(comparison(multichat.chat_summary), use_container_width=True)
+
+        # Charts get per-chat aggregates, not rows, so they stay light however large the chats are
+        daily = comparison(multichat.daily_timeline)
+        fig = px.line(
+            rendering.downsample_groups(daily, "chat_id", "date", "message"),
+            x="date",
+            y="message",
+            color="chat_id",
+            title="Daily Message Count",
+            labels={"date": "Date", "message": "Messages", "chat_id": "Chat"},
+            render_mode="webgl",
+            template="gridon",
+        )
+        plotly_chart(fig, use_container_width=True)
+
+        fig = px.line(
+            comparison(multichat.monthly_timeline),
+            x="month",
+            y="message",
+            color="chat_id",
+            title="Monthly Message Count",
+            labels={"month": "Month", "message": "Messages", "chat_id": "Chat"},
+            template="gridon",
+        )
+        plotly_chart(fig, use_container_width=True)
+
+        st.title("Most Active Users")
+        busiest = comparison(multichat.busiest_users)
+        col1, col2 = st.columns(2)
+        with col1:
+            fig = px.bar(
+                busiest,
+                x="chat_id",
+                y="percent",
+                color="user",
+                title="Share of the five most active users",
+                labels={"chat_id": "Chat", "percent": "% of messages", "user": "User"},
+                template="ggplot2",
+            )
+            fig.update_layout(showlegend=False)
+            plotly_chart(fig, use_container_width=True)
+        with col2:
+            st.dataframe(busiest, height=500, use_container_width=True)
+
+        st.title("Weekly Usage Analysis Chart")
+        weekly = comparison(multichat.weekly_usage)
+        col1, col2 = st.columns(2)
+        with col1:
+            fig = px.imshow(multichat.shares(weekly, "day_name", "message_count"), color_continuous_scale="Blues",
+                            title="% of messages by day of week", labels={"x": "Day of Week", "y": "Chat"})
+            plotly_chart(fig, use_container_width=True)
+        with col2:
+            fig = px.imshow(multichat.shares(weekly, "period", "message_count"), color_continuous_scale="Blues",
+                            title="% of messages by time of day", labels={"x": "Time of Day", "y": "Chat"})
+            plotly_chart(fig, use_container_width=True)
+
+        st.title("Sentiment Analysis")
+        sentiment_counts = comparison(multichat.monthly_sentiment)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.subheader("Sentiment share per chat (%)")
+            st.dataframe(multichat.shares(sentiment_counts, "Sentiment", "Counts").style.background_gradient(cmap="Blues"),
+                         use_container_width=True)
+        with col2:
+            positive = sentiment_counts[sentiment_counts["Sentiment"].isin(["Positive", "Very Positive"])]
+            totals = sentiment_counts.groupby(["chat_id", "month"], observed=True)["Counts"].sum()
+            positive = (positive.groupby(["chat_id", "month"], observed=True)["Counts"].sum() / totals * 100).round(1)
+            fig = px.line(
+                positive.fillna(0).reset_index(name="percent"),
+                x="month",
+                y="percent",
+                color="chat_id",
+                title="Positive messages by month",
+                labels={"month": "Month", "percent": "% positive", "chat_id": "Chat"},
+                template="seaborn",
+            )
+            plotly_chart(fig, use_container_width=True)
+    except Exception as e:
+        st.error(f"Error: {str(e)}")
 
-        # Map sentiment scores to sentiment categories
-        df['Sentiment'] = df['Sentiment Score'].apply(map_sentiment)
+if uploaded_file is not None:
+    try:
+        chats = get_chat_cache()
+        with instrumentation.stage("upload_key"):
+            chat_key = cache.upload_key(uploaded_file.getvalue())
+        with instrumentation.stage("load_chat"):
+            df = chats.get_or_compute(chat_key, ("frame", incremental), lambda: load_chat(uploaded_file, incremental))
 
         with st.expander("View Data"):
+            # Only one page of rows is styled and sent to the browser, coloured against the whole chat
+            pages = rendering.page_count(len(df))
+            page = st.number_input(f"Page (of {pages}, {rendering.PAGE_ROWS} rows each)", min_value=1,
+                                   max_value=pages, value=1, key="data-page") if pages > 1 else 1
+            ranges = chats.get_or_compute(chat_key, "column_ranges", lambda: rendering.column_ranges(df))
             # Use width='100%' to make the table fill the full width
-            st.dataframe(df.style.background_gradient(cmap="Blues"), height=500 ,width=1300,use_container_width=True)
-            csv = df.to_csv(index=False)
+            with instrumentation.stage("view_data.background_gradient", rendering.PAGE_ROWS):
+                st.dataframe(rendering.styled_page(df, page - 1, ranges), height=500 ,width=1300,use_container_width=True)
+            with instrumentation.stage("view_data.to_csv", len(df)):
+                csv = chats.get_or_compute(chat_key, "csv", lambda: df.to_csv(index=False))
 
             # Set use_container_width=False to make the button fill the full width
             st.download_button("Download Data", data=csv, file_name="Whatsapp.csv", mime="text/csv", help='Click here to download the data as a CSV file', use_container_width=False)
@@ -75,46 +352,65 @@ if uploaded_file is not None:
             user_list.remove("group_notification")
         user_list.sort()
         user_list.insert(0, "Overall")
-        df = df[df['user'] != 'group_notification']
+        # Per-user rows and grouped counts, built once per chat so the helpers don't rescan df
+        with instrumentation.stage("analysis_index", len(df)):
+            index = chats.get_or_compute(chat_key, "index", lambda: AnalysisIndex(
+                df[df['kind'] != preprocessor.MessageKind.SYSTEM], on_grow=functools.partial(chats.grow, chat_key)))
+        df = index.data
 
         st.write("")  # Placeholder to create space
         selected_user = st.selectbox(
             "Show analysis wrt", user_list, key="selected-user"
         )
+        # Every section below covers the chosen days only; the index narrows itself to them with a
+        # binary search over the sorted timestamps instead of re-filtering the chat
+        first_day, last_day = (day.item() for day in index.timestamps[[0, -1]].astype("datetime64[D]"))
+        if first_day < last_day:
+            days = st.slider("Date range", min_value=first_day, max_value=last_day, value=(first_day, last_day),
+                             format="YYYY-MM-DD", key="date-range")
+        else:
+            days = (first_day, last_day)
+        if days == (first_day, last_day):
+            start = end = None
+        else:
+            start, end = pd.Timestamp(days[0]), pd.Timestamp(days[1]) + pd.Timedelta(days=1)
         analysis_button = st.button(
             "Show Analysis",
             key="analysis-button",
             help="Click to analyze the data",
         )
-        if analysis_button:
-            # Perform analysis and visualization here
-            num_messages, words, num_media_messages, num_links = helper.fetch_stats(
-                selected_user, df
-            )
-            st.title("Top Statistics")
-            with st.expander("View Data"):
-                # Add your analysis and Plotly visualizations here
+        if analysis_button and index.window(start, end).frame(selected_user).empty:
+            st.warning(f"No messages from {selected_user} between {days[0]} and {days[1]}")
+        elif analysis_button:
+            import plotly.express as px
+            import plotly.graph_objects as go
+
+            # The slow computations start in worker threads right away; the cheap sections below render
+            # meanwhile and each slow one fills its placeholder as soon as it is ready
+            pending = {
+                "stats": submit(helper.fetch_stats, selected_user),
+                "words": submit(helper.most_common_words, selected_user),
+                "word_cloud": submit(helper.word_cloud_png, selected_user),
+                "emoji": submit(helper.emoji_helper, selected_user),
+                "sentiment": submit(helper.monthly_sentiment, selected_user),
+            }
+            slots = {}
 
-                # Top Statistics
-
-                col1, col2, col3, col4 = st.columns(4)
-
-                with col1:
-                    st.metric("Total Messages", num_messages)
-                with col2:
-                    st.metric("Total Words", words)
-                with col3:
-                    st.metric("Media Shared", num_media_messages)
-                with col4:
-                    st.metric("Links Shared", num_links)
+            st.title("Top Statistics")
+            slots["stats"] = st.empty()
+            slots["stats"].caption("Counting messages, words, media and links...")
 
             # Daily Timeline
             st.title("Daily Timeline")
 
-            daily_timeline = helper.daily_timeline(selected_user, df)
+            daily_timeline = analysis(helper.daily_timeline, selected_user)
+            # Long chats have more days than the chart has pixels; keep the shape with fewer points
+            shown = rendering.downsample(daily_timeline, "date", "message")
+            if len(shown) < len(daily_timeline):
+                st.caption(f"Showing {len(shown)} of {len(daily_timeline)} days, downsampled with LTTB")
 
             fig = px.line(
-                daily_timeline,
+                shown,
                 x="date",
                 y="message",
                 title="Daily Message Count",
@@ -123,14 +419,14 @@ if uploaded_file is not None:
             )
 
             # fig.update_xaxes(tickangle=45)
-            st.plotly_chart(fig,use_container_width=True)
+            plotly_chart(fig,use_container_width=True)
 
             st.title("Activity Map")
 
             col1, col2 = st.columns(2)
 
             with col1:
-                most_active_day = helper.week_activity_map(selected_user, df)
+                most_active_day = analysis(helper.week_activity_map, selected_user)
 
                 fig = go.Figure()
 
@@ -155,10 +451,10 @@ if uploaded_file is not None:
                     height=600
                 )
 
-                st.plotly_chart(fig, use_container_width=True)
+                plotly_chart(fig, use_container_width=True)
 
             with col2:
-                most_active_month = helper.month_activity_map(selected_user, df)
+                most_active_month = analysis(helper.month_activity_map, selected_user)
 
                 fig = go.Figure()
 
@@ -183,11 +479,11 @@ if uploaded_file is not None:
                     height=600
                 )
 
-                st.plotly_chart(fig, use_container_width=True)
+                plotly_chart(fig, use_container_width=True)
             # Monthly Timeline
             st.title("Monthly Timeline")
 
-            timeline = helper.monthly_timeline(selected_user, df)
+            timeline = analysis(helper.monthly_timeline, selected_user)
 
             fig = px.line(
                 timeline,
@@ -199,13 +495,13 @@ if uploaded_file is not None:
             )
 
             fig.update_xaxes(tickangle=45)
-            st.plotly_chart(fig,use_container_width=True, height = 200)
+            plotly_chart(fig,use_container_width=True, height = 200)
 
             # Find the person who sent the most messages
             if selected_user == "Overall":
                 st.title("Most Active Users")
 
-                x, new_df = helper.most_busy_users(df)
+                x, new_df = analysis(helper.most_busy_users)
 
                 col1, col2 = st.columns(2)
 
@@ -219,76 +515,110 @@ if uploaded_file is not None:
                     )
                     fig.update_xaxes(title="User")
                     fig.update_yaxes(title="Message Count")
-                    st.plotly_chart(fig,use_container_width=True, height = 200)
+                    plotly_chart(fig,use_container_width=True, height = 200)
 
                 with col2:
                     st.subheader("User wise messege usege")
                     st.dataframe(new_df.style.background_gradient(cmap="Blues"),height=500 ,width=1300,use_container_width=True)
-                    dn=helper.fetch_most_active_user(df)
+                    dn=helper.fetch_most_active_user(df, start, end)
                     csv_data = new_df.to_csv(index=False)
                     st.download_button("Download Data", data=csv_data, file_name="user.csv", mime="text/csv", help='Click here to download the data as a CSV file', use_container_width=False)
 
+                st.title("Conversations")
+                col1, col2 = st.columns(2)
+
+                with col1:
+                    matrix = analysis(helper.reply_matrix)
+                    fig = px.imshow(
+                        matrix,
+                        color_continuous_scale="Blues",
+                        title="Who Replies to Whom",
+                        labels={"x": "Replying to", "y": "Reply from", "color": "Replies"},
+                    )
+                    plotly_chart(fig, use_container_width=True)
+
+                with col2:
+                    st.subheader("Reply time (minutes)")
+                    st.dataframe(analysis(helper.reply_latency), height=500, use_container_width=True)
+
+                sessions = analysis(helper.conversation_sessions)
+                st.subheader(f"Sessions ({len(sessions)}, split at {conversation.SESSION_GAP} of silence)")
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("Median messages per session", int(sessions["messages"].median()))
+                with col2:
+                    st.metric("Median session length (minutes)", sessions["minutes"].median())
+                with col3:
+                    st.metric("Median participants", int(sessions["participants"].median()))
+                # The longest sessions, one page of them
+                st.dataframe(sessions.sort_values("messages", ascending=False, kind="stable").head(rendering.PAGE_ROWS),
+                             height=400, use_container_width=True)
+
             # Most Common Words
             col1, col2 = st.columns(2)
             with col1:
                 st.markdown("## Most Common Words")
-
-                most_common_df = helper.most_common_words(selected_user, df)
-
-                fig = px.bar(
-                    most_common_df,
-                    x=1,  # Frequency column
-                    y=0,  # Word column
-                    title="Most Common Words",
-                    orientation="h",
-                    labels={1: "Frequency", 0: "Word"},  # Corrected column names
-                    template = "plotly_dark",
-                )
-                fig.update_xaxes(title="Frequency")
-                fig.update_yaxes(title="Word")
-                st.plotly_chart(fig,use_container_width=True, height = 200)
+                slots["words"] = st.empty()
+                slots["words"].caption("Counting words...")
 
             with col2:
-                word_cloud = helper.created_word_cloud(selected_user, df)
                 st.write("")
                 st.write("")
                 st.subheader(" Most Words in Wordcloud")
-                # Create a Matplotlib figure and axis
-                fig, ax = plt.subplots()
-                ax.imshow(word_cloud)
-                ax.axis("off")  # Turn off the axis
-
-                # Display the word cloud in the Streamlit app using st.pyplot
-                st.pyplot(fig, use_container_width=False)
+                slots["word_cloud"] = st.empty()
+                slots["word_cloud"].caption("Drawing the word cloud...")
 
             st.write("")
             # Emoji Analysis
             st.title("Emoji Analysis")
+            slots["emoji"] = st.empty()
+            slots["emoji"].caption("Counting emoji...")
 
-            emoji_df = helper.emoji_helper(selected_user, df)
+            st.title("Weekly Usage Analysis Chart")
+            heatmap_data = analysis(helper.weekly_usage_heatmap, selected_user)
 
             col1, col2 = st.columns(2)
 
             with col1:
-                st.subheader("Emoji Analysis Data")
-                st.dataframe(emoji_df.style.background_gradient(cmap="Blues"), height=500, width=1000, use_container_width=True)
-                st.download_button("Download Data", data = csv, file_name = "Emoji.csv", mime = "text/csv",
-                            help = 'Click here to download the data as a CSV file')
-
+                st.subheader("Weekly Usage Chart")
+                st.write("")
+                st.dataframe(heatmap_data.style.background_gradient(cmap="Blues"), width=1000, use_container_width=False)
             with col2:
-                st.subheader("Emoji Analysis Chart")
-                fig = px.pie(
-                    emoji_df.head(),
-                    values='count',
-                    names='emoji',
-                    hole=0.5,
-                    template = "seaborn",
-                )
-                st.plotly_chart(fig,use_container_width=True, height = 200)
-
-            helper.weekly_usage_analysis(selected_user, df)
-
-            # Call the sentiment_analysis function here
-            helper.sentiment_analysis(selected_user, df)
+                fig = px.imshow(heatmap_data,color_continuous_scale="Blues")
+
+                # Customize the heatmap's appearance
+                fig.update_layout(title="Weekly Activity Heatmap",
+                            xaxis_title="Time of Day",
+                            yaxis_title="Day of Week",
+                            width=1000)
+                 # Display the heatmap in Streamlit
+                plotly_chart(fig, use_container_width=True)
+
+            st.title("Sentiment Analysis")
+            slots["sentiment"] = st.empty()
+            slots["sentiment"].caption("Counting sentiment by month...")
+
+            renderers = {"stats": show_stats, "words": show_common_words, "word_cloud": show_word_cloud,
+                         "emoji": show_emoji, "sentiment": show_sentiment}
+            sections = {future: name for name, future in pending.items()}
+            for future in as_completed(sections):
+                name = sections[future]
+                # A section that fails shows its error in its own slot; the others still fill
+                with slots[name].container():
+                    try:
+                        renderers[name](future.result())
+                    except Exception as e:
+                        st.error(f"Error: {str(e)}")
     except Exception as e:
         st.error(f"Error: {str(e)}")
+
+with st.expander("Performance"):
+    timings = recorder.frame()
+    if timings.empty:
+        st.caption("Nothing was computed in this run")
+    else:
+        st.caption("Stages run in this rerun; depth counts the stages they ran inside. Results served from the cache are not measured again.")
+        st.dataframe(timings, use_container_width=True)
+        st.download_button("Download JSON", data=recorder.to_json(), file_name="performance.json",
+                           mime="application/json", help='Click here to download the timings as JSON')
+
@@ -0,0 +1,133 @@
+# Headless reports for a directory of WhatsApp exports, without streamlit. Every chat is parsed,
+# scored and summarised in a worker process of its own; the aggregates are written next to each
+# other under the output directory:
+#
+#   python batch.py exports/ reports/ --format parquet --workers 8
+#
+# parquet writes reports/<chat>/<table>.parquet, json writes reports/<chat>.json with one list of
+# records per table.
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import binning
+import helper
+import preprocessor
+import sentiment
+from analysis_index import AnalysisIndex, OVERALL
+
+
+def load_export(path):
+    # The same frame the app builds for an upload
+    df = pd.concat(preprocessor.preprocess_stream(path, compact=True), ignore_index=True)
+    df = preprocessor.compact_schema(df)
+    # One chat per worker process already keeps every core busy, so VADER runs inline
+    df['Sentiment Score'] = sentiment.compound_scores(df, workers=1)
+    df['Sentiment'] = binning.sentiment_labels(df['Sentiment Score'])
+    return df
+
+
+def user_stats(data, index):
+    rows = []
+    for user in [OVERALL] + index.users:
+        rows.append((user,) + helper.fetch_stats(user, data, index))
+    return pd.DataFrame(rows, columns=['user', 'messages', 'words', 'media', 'links'])
+
+
+def aggregates(df):
+    # Every table the app shows for "Overall", as plain frames with string column names
+    index = AnalysisIndex(df[df['kind'] != preprocessor.MessageKind.SYSTEM])
+    data = index.data
+    _, users = helper.most_busy_users(data, index=index)
+    words = pd.DataFrame(list(helper.word_frequencies(OVERALL, data, index=index).head(20).items()), columns=['word', 'count'])
+    heatmap = helper.weekly_usage_heatmap(OVERALL, data, index=index)
+    heatmap.columns = heatmap.columns.astype(str)
+    return {
+        'stats': user_stats(data, index),
+        'users': users,
+        'daily_timeline': helper.daily_timeline(OVERALL, data, index=index),
+        'monthly_timeline': helper.monthly_timeline(OVERALL, data, index=index),
+        'weekday_activity': helper.week_activity_map(OVERALL, data, index=index).rename_axis('day_name').reset_index(),
+        'month_activity': helper.month_activity_map(OVERALL, data, index=index).rename_axis('month').reset_index(),
+        'weekly_usage': heatmap.reset_index(),
+        'top_words': words,
+        'emoji': helper.emoji_helper(OVERALL, data, index=index),
+        'sentiment_by_month': helper.monthly_sentiment(OVERALL, data, index=index),
+        'reply_latency': helper.reply_latency(data, index=index),
+        'sessions': helper.conversation_sessions(data, index=index),
+    }
+
+
+def chat_names(paths):
+    # File-safe report names, numbered when two exports map to the same one (e.g. "a b" and "a_b")
+    names = []
+    for path in paths:
+        name = base = re.sub(r"[^\w.-]+", "_", os.path.splitext(os.path.basename(path))[0])
+        n = 2
+        while name in names:
+            name = f"{base}_{n}"
+            n += 1
+        names.append(name)
+    return names
+
+
+def write_report(tables, out_dir, name, fmt):
+    if fmt == 'parquet':
+        chat_dir = os.path.join(out_dir, name)
+        os.makedirs(chat_dir, exist_ok=True)
+        for table, frame in tables.items():
+            frame.to_parquet(os.path.join(chat_dir, table + '.parquet'), index=False)
+        return chat_dir
+
+    path = os.path.join(out_dir, name + '.json')
+    report = {table: json.loads(frame.to_json(orient='records', date_format='iso')) for table, frame in tables.items()}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False)
+    return path
+
+
+def analyze_export(path, out_dir, name, fmt):
+    start = time.perf_counter()
+    df = load_export(path)
+    written = write_report(aggregates(df), out_dir, name, fmt)
+    return written, len(df), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WhatsApp chat reports for a directory of exports")
+    parser.add_argument("exports", help="directory of exported .txt chats")
+    parser.add_argument("out_dir", help="where the reports are written")
+    parser.add_argument("--format", choices=["parquet", "json"], default="parquet")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    paths = sorted(os.path.join(args.exports, name) for name in os.listdir(args.exports) if name.endswith(".txt"))
+    # Named in sorted order, so the same directory always gives the same report names
+    names = dict(zip(paths, chat_names(paths)))
+    os.makedirs(args.out_dir, exist_ok=True)
+    failed = 0
+    start = time.perf_counter()
+    # Largest exports first, so a big chat does not start last and hold up the whole run
+    paths.sort(key=os.path.getsize, reverse=True)
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(analyze_export, path, args.out_dir, names[path], args.format): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                written, rows, seconds = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"{futures[future]}: failed: {e}", file=sys.stderr)
+            else:
+                print(f"{written}: {rows} messages in {seconds:.1f} s")
+    print(f"{len(paths) - failed} of {len(paths)} chats in {time.perf_counter() - start:.1f} s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
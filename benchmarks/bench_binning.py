@@ -0,0 +1,82 @@
+# Per-row apply() against the vectorized binning in binning.py on synthetic columns, with a check
+# that both give the same labels:
+#
+#   python -m benchmarks.bench_binning --rows 1M
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import binning
+import preprocessor
+import sentiment
+from benchmarks import synthetic
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def columns(rows, seed):
+    rng = np.random.default_rng(seed)
+    seconds = np.sort(rng.integers(0, 5 * 365 * 86400, rows))
+    timestamps = pd.Series(pd.Timestamp("2019-01-01") + pd.to_timedelta(seconds, unit="s"))
+    scores = pd.Series(rng.uniform(-1, 1, rows).round(4))
+    return timestamps, scores
+
+
+def monthly_sentiment_before(dates, labels):
+    # helper.monthly_sentiment before the month was binned at preprocessing time: the dates are
+    # parsed again on every call and the months formatted one by one
+    frame = pd.DataFrame({'date': dates, 'Sentiment': labels})
+    month_year = pd.to_datetime(frame['date'], errors='coerce').dt.to_period('M').rename('month_year')
+    counts = frame.groupby([month_year, 'Sentiment']).size().reset_index(name='Counts')
+    counts['month_year'] = counts['month_year'].apply(lambda x: x.strftime('%b %Y'))
+    return counts
+
+
+def monthly_sentiment_after(month_year, labels):
+    frame = pd.DataFrame({'month_year': month_year, 'Sentiment': labels})
+    counts = frame.groupby(['month_year', 'Sentiment'], observed=True).size().reset_index(name='Counts')
+    counts['month_year'] = counts['month_year'].astype(str)
+    counts['Sentiment'] = counts['Sentiment'].astype(str)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="row-wise apply vs vectorized binning")
+    parser.add_argument("--rows", type=synthetic.parse_size, default=10 ** 6, help="rows, e.g. 100k 1M")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    timestamps, scores = columns(args.rows, args.seed)
+    hours = timestamps.dt.hour
+    dates = timestamps.dt.date
+    labels = binning.sentiment_labels(scores)
+    # Binned once at preprocessing time, so not part of what a call costs
+    month_year = binning.month_labels(timestamps)
+    cases = [
+        ("period", lambda: hours.apply(preprocessor.get_time_slot), lambda: binning.time_slots(hours)),
+        ("sentiment", lambda: scores.apply(sentiment.map_sentiment), lambda: binning.sentiment_labels(scores)),
+        ("month_year", lambda: timestamps.apply(lambda x: x.strftime('%b %Y')),
+         lambda: binning.month_labels(timestamps)),
+        ("monthly_sentiment", lambda: monthly_sentiment_before(dates, labels.astype(str)),
+         lambda: monthly_sentiment_after(month_year, labels)),
+    ]
+
+    print(f"{args.rows:,} rows")
+    for name, before, after in cases:
+        t_before, expected = timed(before)
+        t_after, result = timed(after)
+        if isinstance(expected, pd.DataFrame):
+            status = "same" if expected.equals(result) else "DIFFERENT"
+        else:
+            status = "same" if (expected.to_numpy(dtype=object) == np.asarray(result, dtype=object)).all() else "DIFFERENT"
+        print(f"{name:18} {t_before:8.3f}s {t_after:8.3f}s  {t_before / t_after:7.1f}x  {status}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# Memory use of the plain and compact preprocess() schemas, helper timings on both, and a check
+# that every helper returns the same values on the compact frame.
+#
+#   python -m benchmarks.bench_compact_schema --scale 50
+import argparse
+import os
+import time
+
+import pandas as pd
+
+import binning
+import helper
+import preprocessor
+import sentiment
+import text_processing
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "SAmple test data.txt")
+HELPERS = ["fetch_stats", "daily_timeline", "monthly_timeline", "week_activity_map", "month_activity_map",
+           "most_common_words", "emoji_helper", "weekly_usage_heatmap", "monthly_sentiment", "word_frequencies",
+           "bigram_frequencies"]
+# Helpers over the whole chat, without a selected user
+CHAT_HELPERS = ["most_busy_users", "fetch_most_active_user"]
+
+
+def cloud_frequencies(user, data):
+    # What the word cloud is laid out from
+    return text_processing.cloud_frequencies(helper.word_frequencies(user, data), helper.bigram_frequencies(user, data))
+
+
+def plain_values(result):
+    # Compares values, not dtypes: categoricals become strings, small ints int64, dates datetime64
+    if isinstance(result, tuple):
+        return tuple(plain_values(item) for item in result)
+    if isinstance(result, pd.Series):
+        return pd.Series(result.to_numpy(dtype="int64"), index=list(result.index), name=result.name)
+    if isinstance(result, pd.DataFrame):
+        # Labelled rows (e.g. the heatmap's days) are compared as a column
+        result = result.reset_index(drop=isinstance(result.index, pd.RangeIndex)).copy()
+        result.columns = [str(column) for column in result.columns]
+        for column in result:
+            values = result[column]
+            if column == "date":
+                result[column] = pd.to_datetime(values).astype("datetime64[ns]")
+            elif values.dtype.kind in "iu":
+                result[column] = values.astype("int64")
+            elif values.dtype.kind not in "fM":
+                result[column] = values.astype(object)
+        return result
+    return result
+
+
+def same(a, b):
+    a, b = plain_values(a), plain_values(b)
+    if isinstance(a, tuple):
+        return all(same(x, y) for x, y in zip(a, b))
+    if isinstance(a, pd.DataFrame):
+        return a.equals(b)
+    if isinstance(a, pd.Series):
+        return a.equals(b) and list(a.index) == list(b.index)
+    return a == b
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="compact schema benchmark")
+    parser.add_argument("--scale", type=int, default=50, help="how many times to repeat the sample chat")
+    args = parser.parse_args()
+
+    with open(SAMPLE, encoding="utf-8") as f:
+        data = f.read() * args.scale
+    plain_time, plain = timed(preprocessor.preprocess, data)
+    compact_time, compact = timed(preprocessor.preprocess, data, None, True)
+    print(f"{len(plain):,} messages, preprocess {plain_time:.2f}s plain / {compact_time:.2f}s compact\n")
+    report = preprocessor.memory_report(plain, compact)
+    print((report[["before", "after"]] / 2 ** 20).round(2).assign(ratio=report["ratio"]).to_string())
+    print()
+
+    # Same scores on both frames; the labels are strings on the plain one, as map_sentiment gave
+    scores = sentiment.compound_scores(plain, cache_path=None)
+    plain["Sentiment Score"] = compact["Sentiment Score"] = scores.to_numpy()
+    compact["Sentiment"] = binning.sentiment_labels(scores)
+    plain["Sentiment"] = compact["Sentiment"].astype(str).to_numpy()
+
+    plain = plain[plain["user"] != "group_notification"]
+    compact = compact[compact["user"] != "group_notification"]
+    users = ["Overall", plain["user"].value_counts().index[0]]
+    for name, func in [(name, getattr(helper, name)) for name in HELPERS] + [("cloud_frequencies", cloud_frequencies)]:
+        for user in users:
+            t_plain, expected = timed(func, user, plain)
+            t_compact, result = timed(func, user, compact)
+            status = "same" if same(expected, result) else "DIFFERENT"
+            print(f"{name:22} {user[:16]:16} {t_plain:7.3f}s {t_compact:7.3f}s  {status}")
+    for name in CHAT_HELPERS:
+        func = getattr(helper, name)
+        t_plain, expected = timed(func, plain)
+        t_compact, result = timed(func, compact)
+        status = "same" if same(expected, result) else "DIFFERENT"
+        print(f"{name:22} {'':16} {t_plain:7.3f}s {t_compact:7.3f}s  {status}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# Compares the old per-message loops of helper.fetch_stats (URLExtract on every message, a full
+# word list for its length) with the bulk counters, on "SAmple test data.txt" repeated --scale
+# times.
+#
+#   python -m benchmarks.bench_fetch_stats --scale 20
+import argparse
+import os
+import time
+
+import helper
+import preprocessor
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "SAmple test data.txt")
+
+
+def legacy_counts(messages):
+    link = []
+    for message in messages:
+        link.extend(helper.url_extractor().find_urls(message))
+
+    words = []
+    for message in messages:
+        words.extend(message.split())
+    return len(words), len(link)
+
+
+def bulk_counts(messages):
+    return int(messages.str.split().str.len().sum()), helper.count_urls(messages)
+
+
+def timed(func, arg):
+    start = time.perf_counter()
+    result = func(arg)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fetch_stats benchmark")
+    parser.add_argument("--scale", type=int, default=20, help="how many times to repeat the sample chat")
+    parser.add_argument("--compact", action="store_true", help="use the compact schema")
+    args = parser.parse_args()
+
+    with open(SAMPLE, encoding="utf-8") as f:
+        data = f.read() * args.scale
+    df = preprocessor.preprocess(data, compact=args.compact)
+    messages = df.loc[df["user"] != "group_notification", "message"]
+    print(f"{len(messages):,} messages")
+
+    legacy_time, legacy = timed(legacy_counts, messages)
+    bulk_time, bulk = timed(bulk_counts, messages)
+    print(f"loops: {legacy_time:8.3f}s  words={legacy[0]:,} links={legacy[1]:,}")
+    print(f"bulk:  {bulk_time:8.3f}s  words={bulk[0]:,} links={bulk[1]:,}  ({legacy_time / bulk_time:.1f}x)")
+    print("same" if legacy == bulk else "DIFFERENT")
+
+
+if __name__ == "__main__":
+    main()
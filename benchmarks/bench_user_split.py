@@ -0,0 +1,92 @@
+# Compares the old per-row re.split user/message loop with what preprocessor.preprocess does now:
+# the _messages line state machine followed by _classify per message, on "SAmple test data.txt"
+# repeated --scale times.
+#
+#   python -m benchmarks.bench_user_split --scale 130
+import argparse
+import io
+import os
+import re
+import time
+
+import pandas as pd
+
+import dialects
+import preprocessor
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "SAmple test data.txt")
+# iOS system events come as "<group name>: \u200e<event>", which the sample chat has none of
+IOS_EVENTS = [
+    "Family: \u200eMessages and calls are end-to-end encrypted. No one outside of this chat can read them.",
+    "Family: \u200eAlice created group \u201cFamily\u201d",
+    "Family: \u200eAlice added Bob",
+    "Family: \u200eBob left",
+    "Family: \u200eCarol joined using this group's invite link",
+    "Family: \u200eAlice changed the group description",
+    "Family: \u200eYou\u2019re now an admin",
+]
+
+
+def legacy_split(user_messages):
+    users = []
+    messages = []
+    for message in user_messages:
+        entry = re.split('([\\w\\W]+?):\\s', message)
+        if entry[1:]:  # User name
+            users.append(entry[1])
+            messages.append(" ".join(entry[2:]))
+        else:
+            users.append('group_notification')
+            messages.append(entry[0])
+    return users, messages
+
+
+def legacy(data, dialect):
+    # Split at the headers, then at the first ": " of each message
+    return legacy_split(dialect.header.split(data)[2::2])
+
+
+def classified(data, dialect):
+    rows = [preprocessor._classify(body)
+            for _, body in preprocessor._messages(io.StringIO(data, newline='\n'), dialect.header)]
+    return [user for user, _, _ in rows], [message for _, message, _ in rows]
+
+
+def best_of(func, repeat, *args):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="user/message split benchmark")
+    parser.add_argument("--scale", type=int, default=130, help="how many times to repeat the sample chat")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(SAMPLE, encoding="utf-8") as f:
+        data = f.read() * args.scale
+    dialect = dialects.detect_dialect(data[:dialects.SAMPLE_SIZE])
+
+    legacy_time, (legacy_users, legacy_messages) = best_of(legacy, args.repeat, data, dialect)
+    parse_time, (users, messages) = best_of(classified, args.repeat, data, dialect)
+    print(f"{len(users):,} messages")
+
+    print(f"re.split loop:        {legacy_time:8.3f}s")
+    print(f"_messages/_classify:  {parse_time:8.3f}s  ({legacy_time / parse_time:.1f}x)")
+    # System events with a ": " in them (e.g. subject changes) were read as users by the loop
+    print(f"user mismatches:      {(pd.Series(users) != pd.Series(legacy_users)).sum()}")
+    # The loop kept line ends and re-joined the pieces of messages that contain another ": "
+    # with spaces
+    legacy_messages = pd.Series(legacy_messages).str.rstrip("\r\n")
+    print(f"message mismatches:   {(pd.Series(messages) != legacy_messages).sum()}")
+    missed = [body for body in IOS_EVENTS if preprocessor._classify(body)[2] != preprocessor.MessageKind.SYSTEM]
+    print(f"iOS events missed:    {len(missed)} of {len(IOS_EVENTS)}")
+
+
+if __name__ == "__main__":
+    main()
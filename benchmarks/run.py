@@ -0,0 +1,168 @@
+# Runs the analysis pipeline stage by stage on synthetic exports (see benchmarks/synthetic.py)
+# and records wall time, CPU time and peak traced memory per stage and size, so a change can be
+# compared against an earlier run:
+#
+#   python -m benchmarks.run --sizes 10k 100k 1M --output before.json
+#   python -m benchmarks.run --sizes 10k 100k 1M --compare before.json
+#
+# Each stage runs once for timing and, unless --no-memory is given, once more under tracemalloc
+# for the peak (tracing slows the run down, so the two are kept apart). tracemalloc sees Python
+# and NumPy allocations but not the Arrow buffers behind string columns. Exports are generated
+# once per (size, clock, seed) and kept in --data-dir. CPU time is the benchmark process's own,
+# so it leaves out sentiment scoring done in worker processes.
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+import helper
+import preprocessor
+import sentiment
+from analysis_index import AnalysisIndex, OVERALL
+from benchmarks import synthetic
+
+
+def stage_parse(state):
+    chunks = preprocessor.preprocess_stream(state["path"], compact=True)
+    state["df"] = preprocessor.compact_schema(pd.concat(chunks, ignore_index=True))
+    return len(state["df"])
+
+
+def stage_sentiment(state):
+    # No on-disk cache, so every distinct message is scored
+    return len(sentiment.compound_scores(state["df"], cache_path=None))
+
+
+def stage_index(state):
+    df = state["df"]
+    state["data"] = df[df['kind'] != preprocessor.MessageKind.SYSTEM]
+    return len(AnalysisIndex(state["data"]).users)
+
+
+def stage_stats(state):
+    return helper.fetch_stats(OVERALL, state["data"])[0]
+
+
+def stage_timelines(state):
+    data = state["data"]
+    return (len(helper.daily_timeline(OVERALL, data)) + len(helper.monthly_timeline(OVERALL, data))
+            + len(helper.week_activity_map(OVERALL, data)) + len(helper.month_activity_map(OVERALL, data)))
+
+
+def stage_conversation(state):
+    data = state["data"]
+    return (len(helper.conversation_sessions(data)) + len(helper.reply_latency(data))
+            + len(helper.reply_matrix(data)))
+
+
+def stage_words(state):
+    return len(helper.most_common_words(OVERALL, state["data"]))
+
+
+def stage_emoji(state):
+    return len(helper.emoji_helper(OVERALL, state["data"]))
+
+
+def stage_wordcloud(state):
+    return len(helper.word_cloud_png(OVERALL, state["data"]))
+
+
+# In pipeline order; later stages use the frame parsed by "parse"
+STAGES = {
+    "parse": stage_parse,
+    "sentiment": stage_sentiment,
+    "index": stage_index,
+    "stats": stage_stats,
+    "timelines": stage_timelines,
+    "conversation": stage_conversation,
+    "words": stage_words,
+    "emoji": stage_emoji,
+    "wordcloud": stage_wordcloud,
+}
+
+
+def measure(func, state, memory=True):
+    wall, cpu = time.perf_counter(), time.process_time()
+    result = func(state)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            func(state)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return wall, cpu, peak, result
+
+
+def export_path(data_dir, size, clock, seed):
+    path = os.path.join(data_dir, f"chat-{size}-{clock}-{seed}.txt")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        synthetic.write_export(path + ".part", size, clock, seed)
+        os.replace(path + ".part", path)
+    return path
+
+
+def run(sizes, stages, clock="12h", seed=0, data_dir=None, memory=True):
+    data_dir = data_dir or os.path.join(tempfile.gettempdir(), "whatsapp-analyzer-bench")
+    records = []
+    for size in sizes:
+        state = {"path": export_path(data_dir, size, clock, seed)}
+        for name in STAGES:
+            if name not in stages and name not in ("parse", "index"):
+                continue
+            wall, cpu, peak, result = measure(STAGES[name], state, memory and name in stages)
+            if name not in stages:
+                # Needed by the later stages but not asked for
+                continue
+            records.append({"messages": size, "clock": clock, "stage": name, "wall_s": round(wall, 4),
+                            "cpu_s": round(cpu, 4), "peak_mb": None if peak is None else round(peak / 2 ** 20, 1),
+                            "result": result})
+            print(f"{size:>10} {name:<12} {wall:9.3f} s  cpu {cpu:9.3f} s"
+                  + ("" if peak is None else f"  peak {peak / 2 ** 20:9.1f} MB"), flush=True)
+    return pd.DataFrame(records)
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = pd.DataFrame(json.load(f))
+    merged = results.merge(baseline, on=["messages", "clock", "stage"], suffixes=("", "_before"))
+    merged["speedup"] = (merged["wall_s_before"] / merged["wall_s"]).round(2)
+    columns = ["messages", "stage", "wall_s_before", "wall_s", "speedup"]
+    if merged["peak_mb"].notna().any() and merged["peak_mb_before"].notna().any():
+        merged["memory_ratio"] = (merged["peak_mb"] / merged["peak_mb_before"]).round(2)
+        columns += ["peak_mb_before", "peak_mb", "memory_ratio"]
+    return merged[columns]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="per-stage benchmark on synthetic exports")
+    parser.add_argument("--sizes", nargs="+", type=synthetic.parse_size, default=[10 ** 4, 10 ** 5],
+                        help="messages per export, e.g. 10k 100k 1M 10M")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--clock", choices=["12h", "24h"], default="12h")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", help="where generated exports are kept")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.stages, args.clock, args.seed, args.data_dir, not args.no_memory)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results.to_dict(orient="records"), f, indent=1)
+    if args.compare:
+        print()
+        print(compare(results, args.compare).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# Deterministic synthetic WhatsApp exports for benchmarks. The same (messages, clock, seed) always
+# gives the same file: Android-style headers in the 12h ("24/08/22, 7:53 pm - ", with a narrow
+# no-break space before am/pm) or 24h ("24/08/2022, 19:53 - ") layout, with multi-line
+# messages, media placeholders, deleted messages, URLs, emoji and system notifications.
+#
+#   python -m benchmarks.synthetic 1000000 /tmp/chat-1M.txt --clock 24h
+import argparse
+import itertools
+import random
+from datetime import datetime, timedelta
+
+WORDS = (
+    "hi hello bhai yaar kal aaj class exam assignment deadline quiz marks course term project "
+    "lecture notes please thanks ok okay haan nahi kya kab kaun kaise kyun done submit form link "
+    "group meeting tomorrow today morning night good great bad sorry happy sad love awesome "
+    "problem solution doubt question answer week grade portal video live session register fee "
+    "result cgpa degree diploma foundation python java maths stats english google drive sheet "
+    "the a an is are was to of in on for with and or but not this that it you we they me my"
+).split()
+EMOJI = ["😂", "🙂", "👍", "🙏", "\u2764\ufe0f", "🔥", "😭", "👉", "\u25b6\ufe0f", "\u26a0\ufe0f", "👍🏽", "\U0001F468\u200d\U0001F4BB", "🇮🇳", "🎉", "😅"]
+URLS = ["https://forms.gle/{}", "https://youtu.be/{}", "www.example.com/{}", "https://study.iitm.ac.in/ds/{}",
+        "http://bit.ly/{}"]
+NOTIFICATIONS = ["{} joined using this group's invite link", "{} left", "~ Admin added {}",
+                 "~ Admin changed the subject to \"Batch {}\"", "{} changed their phone number"]
+START = datetime(2019, 1, 1, 8, 0)
+SPAN = timedelta(days=3 * 365)
+
+
+def _header(moment, clock):
+    if clock == "12h":
+        hour = moment.hour % 12 or 12
+        suffix = "am" if moment.hour < 12 else "pm"
+        return f"{moment.day:02d}/{moment.month:02d}/{moment.year % 100:02d}, {hour}:{moment.minute:02d}\u202f{suffix} - "
+    return f"{moment.day:02d}/{moment.month:02d}/{moment.year}, {moment.hour:02d}:{moment.minute:02d} - "
+
+
+def _text(rng):
+    words = rng.choices(WORDS, k=rng.randint(1, 14))
+    if rng.random() < 0.3:
+        # Numbers keep a share of the messages distinct, like real chats
+        words.append(str(rng.randint(1, 10 ** 6)))
+    return " ".join(words)
+
+
+def generate_lines(messages, clock="12h", seed=0):
+    # Yields the export line by line; memory use does not depend on the number of messages
+    rng = random.Random(seed)
+    users = [f"+91 {rng.randint(60000, 99999)} {rng.randint(10000, 99999)}"
+             for _ in range(max(5, min(500, messages // 200)))]
+    users += ["Aman", "Priya 🌸", "~ Admin"]
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(users))))
+    mean_gap = SPAN.total_seconds() / max(messages, 1)
+    elapsed = 0.0
+    minute = 0
+
+    header = _header(START, clock)
+    yield header + "Messages and calls are end-to-end encrypted. No one outside of this chat, " \
+                   "not even WhatsApp, can read or listen to them. Tap to learn more.\n"
+    for _ in range(messages - 1):
+        elapsed += rng.expovariate(1 / mean_gap)
+        if elapsed // 60 != minute:
+            # Busy chats put many messages in the same minute; format each minute once
+            minute = elapsed // 60
+            header = _header(START + timedelta(minutes=minute), clock)
+        kind = rng.random()
+        if kind < 0.02:
+            yield header + rng.choice(NOTIFICATIONS).format(rng.choice(users)) + "\n"
+            continue
+        user = rng.choices(users, cum_weights=cum_weights)[0]
+        if kind < 0.07:
+            yield f"{header}{user}: <Media omitted>\n"
+        elif kind < 0.08:
+            yield f"{header}{user}: This message was deleted\n"
+        elif kind < 0.12:
+            # Multi-line message: continuation lines carry no header
+            yield f"{header}{user}: {_text(rng)}\n"
+            for _ in range(rng.randint(1, 4)):
+                yield _text(rng) + "\n"
+        else:
+            text = _text(rng)
+            if rng.random() < 0.04:
+                text += " " + rng.choice(URLS).format(rng.randint(1, 10 ** 5))
+            if rng.random() < 0.15:
+                text += " " + "".join(rng.choices(EMOJI, k=rng.randint(1, 3)))
+            yield f"{header}{user}: {text}\n"
+
+
+def write_export(path, messages, clock="12h", seed=0):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        batch = []
+        for line in generate_lines(messages, clock, seed):
+            batch.append(line)
+            if len(batch) >= 10000:
+                f.write("".join(batch))
+                batch = []
+        f.write("".join(batch))
+    return path
+
+
+def parse_size(text):
+    # "10k", "2.5M" or "500"
+    text = text.strip().lower()
+    scale = {"k": 10 ** 3, "m": 10 ** 6}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="synthetic WhatsApp export generator")
+    parser.add_argument("messages", type=parse_size)
+    parser.add_argument("path")
+    parser.add_argument("--clock", choices=["12h", "24h"], default="12h")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_export(args.path, args.messages, args.clock, args.seed)
+
+
+if __name__ == "__main__":
+    main()
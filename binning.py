@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+# Whole-column versions of the per-row labelling functions (preprocessor.get_time_slot,
+# sentiment.map_sentiment and strftime of the month), one numpy pass each instead of a Python
+# call per row. They return Categoricals; time slots and sentiments list their categories in
+# lexical order, like the compact schema, so groupbys come out in the same order as with the
+# strings of the per-row functions.
+
+# Hour bins [0, 4), [4, 8), ... as in get_time_slot()
+HOUR_EDGES = [0, 4, 8, 12, 17, 21, 24]
+TIME_SLOTS = ["Late Night", "Early Morning", "Morning", "Afternoon", "Evening", "Night"]
+# Lower bounds of each sentiment but the last, highest first, as in map_sentiment()
+SENTIMENT_THRESHOLDS = [0.5, 0.1, -0.1, -0.5]
+SENTIMENTS = ["Very Positive", "Positive", "Neutral", "Negative", "Very Negative"]
+
+
+def _lexical(categorical):
+    return categorical.reorder_categories(sorted(categorical.categories))
+
+
+def time_slots(hours):
+    return _lexical(pd.cut(np.asarray(hours), HOUR_EDGES, right=False, labels=TIME_SLOTS))
+
+
+def sentiment_labels(scores):
+    # Anything below the last threshold (NaN included) is "Very Negative", like map_sentiment()
+    scores = np.asarray(scores, dtype=float)
+    codes = np.select([scores >= threshold for threshold in SENTIMENT_THRESHOLDS],
+                      range(len(SENTIMENT_THRESHOLDS)), default=len(SENTIMENT_THRESHOLDS))
+    return _lexical(pd.Categorical.from_codes(codes, categories=SENTIMENTS))
+
+
+def month_labels(timestamps):
+    # "Jan 2023" per timestamp. Only the distinct months are formatted, and the categories are
+    # ordered by date rather than by name, so sorting or grouping by them is chronological.
+    months = pd.DatetimeIndex(timestamps).to_period('M')
+    codes, uniques = pd.factorize(months, sort=True)
+    return pd.Categorical.from_codes(codes, categories=uniques.strftime('%b %Y'), ordered=True)
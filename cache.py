@@ -0,0 +1,87 @@
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# Shared by every session of the app; least recently used chats are evicted past this budget
+MAX_BYTES = int(float(os.environ.get("WA_CACHE_MAX_MB", "512")) * 1024 * 1024)
+
+
+def upload_key(data):
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def sizeof(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(value, pd.DataFrame) else int(usage)
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(sizeof(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(item) for item in value.values())
+    return sys.getsizeof(value)
+
+
+class ChatCache:
+    # Byte-bounded LRU of chats. Each chat (keyed by upload hash) holds named values: the parsed
+    # frame and any per-user aggregates derived from it. A chat is evicted as a whole.
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._chats = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        return sum(self._sizes.values())
+
+    def get(self, key, name, default=None):
+        with self._lock:
+            values = self._chats.get(key)
+            if values is None or name not in values:
+                return default
+            self._chats.move_to_end(key)
+            return values[name]
+
+    def put(self, key, name, value):
+        size = sizeof(value)
+        with self._lock:
+            values = self._chats.setdefault(key, {})
+            old = values.get(name)
+            values[name] = value
+            self._sizes[key] = self._sizes.get(key, 0) + size - (sizeof(old) if old is not None else 0)
+            self._chats.move_to_end(key)
+            self._evict()
+        return value
+
+    def grow(self, key, size):
+        # A stored value changed size after it was put, e.g. an AnalysisIndex that memoized more
+        # results; size is the difference in bytes
+        with self._lock:
+            if key in self._sizes:
+                self._sizes[key] += size
+                self._evict()
+
+    def get_or_compute(self, key, name, compute):
+        # compute() runs outside the lock; concurrent sessions may both compute a missing value
+        missing = object()
+        value = self.get(key, name, missing)
+        if value is missing:
+            value = self.put(key, name, compute())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._chats.clear()
+            self._sizes.clear()
+
+    def _evict(self):
+        while self._chats and sum(self._sizes.values()) > self.max_bytes:
+            key, _ = self._chats.popitem(last=False)
+            del self._sizes[key]
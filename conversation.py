@@ -0,0 +1,112 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import instrumented
+
+# Conversations in a chat, from the gaps between consecutive messages. A silence longer than
+# SESSION_GAP ends a session; within a session, a message from someone other than the previous
+# sender is a reply to them. Everything below is a few passes of numpy diff/cumsum/bincount over
+# the frame, linear in the number of messages.
+SESSION_GAP = pd.Timedelta(minutes=int(os.environ.get("WA_SESSION_GAP_MINUTES", "60")))
+
+
+def _ordered(data):
+    if not data['timestamp'].is_monotonic_increasing:
+        data = data.sort_values('timestamp', kind='stable')
+    return data
+
+
+@instrumented
+def turns(data, gap=SESSION_GAP):
+    # One row per message, in time order: its sender, the previous sender, the seconds since the
+    # previous message, its session number and whether it is a reply
+    data = _ordered(data)
+    user = pd.Categorical(data['user']).remove_unused_categories()
+    codes = user.codes.astype(np.int64)
+    timestamps = data['timestamp'].to_numpy()
+    n = len(codes)
+
+    seconds = np.full(n, np.nan)
+    seconds[1:] = np.diff(timestamps) / np.timedelta64(1, 's')
+    # NaN > x is False, so only the first message opens a session without a long gap before it
+    new_session = seconds > gap.total_seconds()
+    new_session[:1] = True
+    switch = np.zeros(n, dtype=bool)
+    switch[1:] = np.diff(codes) != 0
+
+    previous = np.full(n, -1, dtype=np.int64)
+    previous[1:] = codes[:-1]
+    return pd.DataFrame({
+        'timestamp': timestamps,
+        'user': user,
+        'previous': pd.Categorical.from_codes(previous, dtype=user.dtype),
+        'gap': seconds,
+        'session': np.cumsum(new_session) - 1,
+        'reply': switch & ~new_session,
+    })
+
+
+@instrumented
+def sessions(turn_table):
+    # One row per session: when it started and ended, who opened it, its messages, replies and
+    # participants
+    session = turn_table['session'].to_numpy()
+    if not len(session):
+        return pd.DataFrame({
+            'start': turn_table['timestamp'].iloc[:0],
+            'end': turn_table['timestamp'].iloc[:0],
+            'started_by': turn_table['user'].to_numpy()[:0],
+            'messages': np.zeros(0, dtype=np.int64),
+            'replies': np.zeros(0, dtype=np.int64),
+            'participants': np.zeros(0, dtype=np.int64),
+            'minutes': np.zeros(0),
+        })
+    codes = turn_table['user'].cat.codes.to_numpy().astype(np.int64)
+    k = max(len(turn_table['user'].cat.categories), 1)
+    count = int(session[-1]) + 1
+    # Sessions are contiguous runs, so each one starts where the session number changes
+    starts = np.flatnonzero(np.diff(session, prepend=-1))
+    ends = np.append(starts[1:], len(session)) - 1
+
+    # Distinct (session, user) pairs, by hashing rather than sorting
+    pairs = pd.unique(session * k + codes)
+    participants = np.bincount(pairs // k, minlength=count)
+
+    timestamps = turn_table['timestamp'].to_numpy()
+    table = pd.DataFrame({
+        'start': timestamps[starts],
+        'end': timestamps[ends],
+        'started_by': turn_table['user'].to_numpy()[starts],
+        'messages': np.bincount(session, minlength=count),
+        'replies': np.bincount(session, weights=turn_table['reply'].to_numpy(), minlength=count).astype(np.int64),
+        'participants': participants,
+    })
+    table['minutes'] = ((table['end'] - table['start']) / pd.Timedelta(minutes=1)).round(1)
+    return table
+
+
+@instrumented
+def reply_latency(turn_table):
+    # Per user: replies sent and the median and mean minutes they took to reply, most replies first
+    replies = turn_table[turn_table['reply']]
+    minutes = (replies['gap'] / 60).rename('minutes')
+    table = minutes.groupby(replies['user'], observed=True).agg(['size', 'median', 'mean'])
+    table.columns = ['replies', 'median_minutes', 'mean_minutes']
+    table[['median_minutes', 'mean_minutes']] = table[['median_minutes', 'mean_minutes']].round(1)
+    return table.sort_values('replies', ascending=False, kind='stable').reset_index()
+
+
+@instrumented
+def reply_matrix(turn_table, users=None):
+    # Replies from each user (rows) to each user (columns); users limits both to those names
+    replies = turn_table[turn_table['reply']]
+    categories = turn_table['user'].cat.categories
+    k = len(categories)
+    counts = np.bincount(replies['user'].cat.codes.to_numpy().astype(np.int64) * k
+                         + replies['previous'].cat.codes.to_numpy(), minlength=k * k).reshape(k, k)
+    matrix = pd.DataFrame(counts, index=pd.Index(categories, name='from'), columns=pd.Index(categories, name='to'))
+    if users is not None:
+        matrix = matrix.loc[list(users), list(users)]
+    return matrix
@@ -0,0 +1,107 @@
+import re
+from collections import namedtuple
+
+import pandas as pd
+
+# Only this many characters from the start of an export are used to pick its dialect
+SAMPLE_SIZE = 8192
+
+# header: compiled line-start pattern whose only group is the timestamp text
+# time_format: explicit pd.to_datetime format for that timestamp text
+Dialect = namedtuple("Dialect", ["name", "header", "time_format"])
+
+DIALECTS = {}
+
+# Android and iOS exports may put a narrow no-break space before AM/PM
+_space = r"[ \u202f\u00a0]"
+_date = r"\d{1,2}/\d{1,2}/\d{2,4}"
+
+
+def register_dialect(name, header, time_format):
+    # header is the regex of one message header, with a single group around the timestamp
+    dialect = Dialect(name, re.compile("^" + header, re.MULTILINE), time_format)
+    DIALECTS[name] = dialect
+    return dialect
+
+
+# Registration order breaks ties during detection, so day-first 2-digit years (the original
+# format of this app) win when a sample cannot tell the variants apart
+for _order, _date_format in (("dmy", "%d/%m"), ("mdy", "%m/%d")):
+    for _year in ("%y", "%Y"):
+        _suffix = _order + ("_yy" if _year == "%y" else "_yyyy")
+        register_dialect("android_12h_" + _suffix, rf"({_date},{_space}\d{{1,2}}:\d{{2}}{_space}[AaPp][Mm]) - ",
+                         f"{_date_format}/{_year}, %I:%M %p")
+        register_dialect("android_24h_" + _suffix, rf"({_date},{_space}\d{{1,2}}:\d{{2}}) - ",
+                         f"{_date_format}/{_year}, %H:%M")
+        register_dialect("ios_12h_" + _suffix,
+                         rf"\u200e?\[({_date},{_space}\d{{1,2}}:\d{{2}}:\d{{2}}{_space}[AaPp][Mm])\] ",
+                         f"{_date_format}/{_year}, %I:%M:%S %p")
+        register_dialect("ios_24h_" + _suffix, rf"\u200e?\[({_date},{_space}\d{{1,2}}:\d{{2}}:\d{{2}})\] ",
+                         f"{_date_format}/{_year}, %H:%M:%S")
+
+
+def _normalize(timestamps):
+    return pd.Series(timestamps, dtype=object).str.replace(r"[\u202f\u00a0]", " ", regex=True)
+
+
+def detect_dialect(sample):
+    # Scores every registered dialect on the sample: headers found, then how many of their
+    # timestamps parse with the dialect's format. Only the sample is ever scanned.
+    best, best_score = None, (0, 0)
+    for dialect in DIALECTS.values():
+        timestamps = dialect.header.findall(sample)
+        if not timestamps:
+            continue
+        parsed = pd.to_datetime(_normalize(timestamps), format=dialect.time_format, errors="coerce")
+        score = (parsed.notna().sum(), len(timestamps))
+        if score > best_score:
+            best, best_score = dialect, score
+    if best is None:
+        raise ValueError("Unrecognised chat export format")
+    return best
+
+
+# A date field above 12 can only be the day
+_date_fields = re.compile(r"(\d{1,2})/(\d{1,2})/")
+DATE_ORDERS = {"dmy": "%d/%m", "mdy": "%m/%d"}
+
+
+def date_order(timestamp):
+    # "dmy" or "mdy" when the timestamp gives its day/month order away, else None
+    first, second = _date_fields.search(timestamp).groups()
+    if int(first) > 12:
+        return "dmy"
+    if int(second) > 12:
+        return "mdy"
+    return None
+
+
+def with_date_order(dialect, order):
+    # The dialect with the same header and year format in the given day/month order
+    prefix = DATE_ORDERS[order]
+    time_format = prefix + dialect.time_format[len(prefix):]
+    for other in DIALECTS.values():
+        if other.header.pattern == dialect.header.pattern and other.time_format == time_format:
+            return other
+    return dialect
+
+
+def settle_dialect(dialect, timestamps):
+    # A sample whose dates are all 12 or below cannot tell day-first from month-first. Reads on
+    # through timestamps (an iterable, consumed only up to the answer) to the first date that can,
+    # so the whole export is parsed in one order; the detected dialect stands if none does.
+    for timestamp in timestamps:
+        order = date_order(timestamp)
+        if order is not None:
+            return with_date_order(dialect, order)
+    return dialect
+
+
+def parse_timestamps(dialect, timestamps):
+    # One vectorized call with an explicit format. The day/month order is settled once per export
+    # (settle_dialect), so timestamps that do not fit it are an error, not a reason to switch.
+    timestamps = _normalize(timestamps)
+    try:
+        return pd.to_datetime(timestamps, format=dialect.time_format)
+    except ValueError as e:
+        raise ValueError(f"Timestamp not in the {dialect.name} format of the rest of the export: {e}") from e
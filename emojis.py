@@ -0,0 +1,47 @@
+import re
+from functools import lru_cache
+
+import pandas as pd
+
+# Emoji that are sequences rather than a single pictograph
+_flag = "[\U0001F1E6-\U0001F1FF]{2}"
+_keycap = "[0-9#*]\ufe0f?\u20e3"
+_tag_sequence = "\U0001F3F4[\U000E0020-\U000E007E]+\U000E007F"
+_skin_tone = "[\U0001F3FB-\U0001F3FF]"
+
+
+def _ranges(codepoints):
+    # Sorted codepoints as a compact regex character class body
+    parts = []
+    codepoints = sorted(codepoints)
+    start = prev = codepoints[0]
+    for cp in codepoints[1:] + [None]:
+        if cp is not None and cp == prev + 1:
+            prev = cp
+            continue
+        parts.append(re.escape(chr(start)) if start == prev else f"{re.escape(chr(start))}-{re.escape(chr(prev))}")
+        if cp is not None:
+            start = prev = cp
+    return "".join(parts)
+
+
+@lru_cache(maxsize=None)
+def emoji_pattern():
+    # One compiled pattern: a flag, a keycap, a tag sequence (subdivision flags), or pictographs
+    # with optional variation selector and skin tone joined by ZWJ. The pictograph class is derived
+    # from the emoji package's data once per process.
+    import emoji
+
+    starts = {ord(key[0]) for key in emoji.EMOJI_DATA}
+    starts -= {ord(c) for c in "0123456789#*"}
+    starts -= set(range(0x1F1E6, 0x1F200))
+    element = f"[{_ranges(starts)}]\ufe0f?{_skin_tone}?"
+    return re.compile(f"{_flag}|{_keycap}|{_tag_sequence}|{element}(?:\u200d{element})*")
+
+
+def emoji_counts(messages):
+    # (emoji, count) rows, most frequent first, from a single scan of the joined messages
+    found = emoji_pattern().findall("\n".join(messages))
+    counts = pd.Series(found, dtype=object, name='emoji').value_counts().reset_index()
+    counts.columns = ['emoji', 'count']
+    return counts
@@ -1,214 +1,287 @@
 # Import necessary libraries at the beginning of your helper.py
 # import emoji
+import io
+import re
+from functools import lru_cache
 import pandas as pd
-from collections import Counter
-from urlextract import URLExtract
-from wordcloud import WordCloud
-import advertools as adv
-import streamlit as st
-import plotly.express as px
 
-extract = URLExtract()
+import conversation
+import emojis
+import text_processing
+from analysis_index import time_slice
+from instrumentation import instrumented
+from preprocessor import MessageKind
 
-def fetch_stats(selected_data, data):
-    if selected_data != "Overall":
-        data = data[data["user"] == selected_data]
+url_candidate_pattern = re.compile(r'\.\w')
+# Users shown in the reply matrix, the busiest first
+REPLY_MATRIX_USERS = 15
+
+
+@lru_cache(maxsize=None)
+def url_extractor():
+    # URLExtract loads its TLD list on creation, so it is only built once it is needed
+    from urlextract import URLExtract
+    return URLExtract()
+
+
+def _user_data(selected_user, data, index=None):
+    # Rows of the selected user; with an AnalysisIndex this is a lookup instead of a full scan
+    if index is not None:
+        return index.frame(selected_user)
+    if selected_user != 'Overall':
+        data = data[data['user'] == selected_user]
+    return data
+
+
+def _window(data, index, start, end):
+    # Every helper takes an optional start (inclusive) and end (exclusive) time. With an
+    # AnalysisIndex the window is two binary searches and its results are cached per window.
+    if start is None and end is None:
+        return data, index
+    if index is not None:
+        index = index.window(start, end)
+        return index.data, index
+    return time_slice(data, start, end), None
+
+
+def _observed(counts):
+    # value_counts() of a categorical column also lists categories that never occur
+    return counts[counts > 0]
+
+
+def _sorted_counts(counts):
+    # Same shape as Series.value_counts(): most frequent first, named 'count'
+    return counts.sort_values(ascending=False, kind='stable').rename('count')
+
+@instrumented
+def fetch_stats(selected_data, data, index=None, start=None, end=None):
+    data, index = _window(data, index, start, end)
+    data = _user_data(selected_data, data, index)
 
     num_messages = data.shape[0]
-    num_media_messages = data[data['message'] == '<Media omitted>\n'].shape[0]
+    num_media_messages = int((data['kind'] == MessageKind.MEDIA).sum())
+
+    num_words = int(data['message'].str.split().str.len().sum())
 
-    link = []
-    for message in data["message"]:
-        link.extend(extract.find_urls(message))
+    return num_messages, num_words, num_media_messages, count_urls(data['message'])
 
-    words = []
-    for message in data["message"]:
-        words.extend(message.split())
 
-    return num_messages, len(words), num_media_messages, len(link)
+@instrumented
+def count_urls(messages):
+    # Same count as running URLExtract on every message, but it only sees the distinct messages
+    # that have a dot followed by a word character, which every URL's TLD needs
+    candidates = messages[messages.str.contains(url_candidate_pattern)].value_counts()
+    return int(sum(len(url_extractor().find_urls(message)) * count for message, count in candidates.items()))
 
 
-def fetch_most_active_user(data):
-    temp = data[data['user'] != 'group_notification']
-    x = temp["user"].value_counts().head()
-    result = round((temp["user"].value_counts() / temp.shape[0]) * 100, 1).reset_index().rename(
+@instrumented
+def fetch_most_active_user(data, start=None, end=None):
+    data = time_slice(data, start, end)
+    temp = data[data['kind'] != MessageKind.SYSTEM]
+    # Users with the same count are listed by name, whatever the dtype of the column
+    counts = _sorted_counts(_observed(temp["user"].value_counts()).sort_index())
+    x = counts.head()
+    result = round((counts / temp.shape[0]) * 100, 1).reset_index().rename(
         {"index": "user", "user": "percentage"})
     return result
 
 
-def created_word_cloud(selected_user, data):
-    f = open('stop_hinglish.txt', 'r')
-    stop_words = f.read()
+@instrumented
+def word_frequencies(selected_user, data, index=None, start=None, end=None):
+    # Token counts shared by most_common_words and created_word_cloud, tokenized once per user
+    data, index = _window(data, index, start, end)
 
-    if selected_user != 'Overall':
-        data = data[data['user'] == selected_user]
+    def compute():
+        return text_processing.word_counts(text_processing.analysable_messages(_user_data(selected_user, data, index)))
 
-    temp = data[data['user'] != 'group_notification']
-    temp = temp[temp['message'] != '<Media omitted>\n']
+    if index is not None:
+        return index.derived('word_counts', selected_user, compute)
+    return compute()
 
-    def remove_stop_words(message):
-        y = []
-        for word in message.lower().split():
-            if word not in stop_words:
-                y.append(word)
-        return " ".join(y)
 
-    wc = WordCloud(width=800, height=250, min_font_size=10, background_color='white', colormap='RdYlGn',contour_color='#5d0f24',collocations=True)
-    temp['message'] = temp['message'].apply(remove_stop_words)
-    df_wc = wc.generate(temp['message'].str.cat(sep=" "))
-    return df_wc
+@instrumented
+def bigram_frequencies(selected_user, data, index=None, start=None, end=None):
+    # Adjacent word pairs for the word cloud's collocations, counted once per user
+    data, index = _window(data, index, start, end)
 
+    def compute():
+        return text_processing.bigram_counts(text_processing.analysable_messages(_user_data(selected_user, data, index)))
 
-def most_common_words(selected_user, data):
-    f = open('stop_hinglish.txt', 'r')
-    stop_words = f.read()
+    if index is not None:
+        return index.derived('bigram_counts', selected_user, compute)
+    return compute()
 
-    if selected_user != 'Overall':
-        data = data[data['user'] == selected_user]
 
-    temp = data[data['user'] != 'group_notification']
-    temp = temp[temp['message'] != '<Media omitted>\n']
+@instrumented
+def created_word_cloud(selected_user, data, index=None, start=None, end=None):
+    from wordcloud import WordCloud
+    data, index = _window(data, index, start, end)
+    counts = word_frequencies(selected_user, data, index)
+    bigrams = bigram_frequencies(selected_user, data, index)
+
+    frequencies = text_processing.cloud_frequencies(counts, bigrams)
+    if not frequencies:
+        # Only media or deleted messages: nothing to draw
+        return None
+
+    # Laid out from the counts, with the same collocations generate() would find in the text
+    wc = WordCloud(width=800, height=250, min_font_size=10, background_color='white', colormap='RdYlGn',contour_color='#5d0f24',collocations=True)
+    df_wc = wc.generate_from_frequencies(frequencies)
+    return df_wc
 
-    words = []
 
-    for message in temp['message']:
-        for word in message.lower().split():
-            if word not in stop_words:
-                words.append(word)
+@instrumented
+def word_cloud_png(selected_user, data, index=None, start=None, end=None):
+    # The rendered word cloud as PNG bytes, small enough to cache and sent as is by st.image;
+    # None when there are no words
+    data, index = _window(data, index, start, end)
+    cloud = created_word_cloud(selected_user, data, index)
+    if cloud is None:
+        return None
+    buffer = io.BytesIO()
+    cloud.to_image().save(buffer, format='PNG')
+    return buffer.getvalue()
 
-    most_common_data = pd.DataFrame(Counter(words).most_common(20))
+
+@instrumented
+def most_common_words(selected_user, data, index=None, start=None, end=None):
+    data, index = _window(data, index, start, end)
+    counts = word_frequencies(selected_user, data, index)
+
+    most_common_data = pd.DataFrame(list(counts.head(20).items()))
     return most_common_data
 
-def emoji_helper(selected_user, data):
-    if selected_user != 'Overall':
-        data = data[data['user'] == selected_user]
+@instrumented
+def emoji_helper(selected_user, data, index=None, start=None, end=None):
+    data, index = _window(data, index, start, end)
 
-    emoji_summary = adv.extract_emoji(data['message'])['emoji_flat']
-    df = pd.DataFrame(emoji_summary, columns=['emoji'])
-    emoji_counts = df['emoji'].value_counts().reset_index()
-    emoji_counts.columns = ['emoji', 'count']
-    return emoji_counts
+    def compute():
+        return emojis.emoji_counts(_user_data(selected_user, data, index)['message'])
 
+    # Counted once per user when an index is available
+    if index is not None:
+        return index.derived('emoji_counts', selected_user, compute)
+    return compute()
 
-def monthly_timeline(selected_user, data):
-    if selected_user != 'Overall':
-        data = data[data['user'] == selected_user]
 
-    timeline = data.groupby(['year', 'month']).count()['message'].reset_index()
+@instrumented
+def monthly_timeline(selected_user, data, index=None, start=None, end=None):
+    data, index = _window(data, index, start, end)
+    if index is not None:
+        timeline = index.monthly[selected_user].rename('message').reset_index()
+    else:
+        data = _user_data(selected_user, data)
+        timeline = data.groupby(['year', 'month'], observed=True).count()['message'].reset_index()
 
     # Combine 'month' and 'year' columns into a new 'time' column
-    timeline['time'] = timeline['month'] + '-' + timeline['year'].astype(str)
+    timeline['time'] = timeline['month'].astype(str) + '-' + timeline['year'].astype(str)
 
     return timeline
 
 
-def daily_timeline(selected_user, data):
-    if selected_user != 'Overall':
-        data = data[data['user'] == selected_user]
+@instrumented
+def daily_timeline(selected_user, data, index=None, start=None, end=None):
+    data, index = _window(data, index, start, end)
+    if index is not None:
+        return index.daily[selected_user].rename('message').reset_index()
 
-    daily_timeline = data.groupby('date').count()['message'].reset_index()
+    data = _user_data(selected_user, data)
+    daily_timeline = data.groupby('date', observed=True).count()['message'].reset_index()
 
     return daily_timeline
 
 
-def week_activity_map(selected_user, data):
-    if selected_user != 'Overall':
-        data = data[data['user'] == selected_user]
+@instrumented
+def week_activity_map(selected_user, data, index=None, start=None, end=None):
+    data, index = _window(data, index, start, end)
+    if index is not None:
+        return _sorted_counts(index.weekday[selected_user])
 
-    return data['day_name'].value_counts()
+    data = _user_data(selected_user, data)
+    return _observed(data['day_name'].value_counts())
 
 
-def month_activity_map(selected_user, data):
-    if selected_user != 'Overall':
-        data = data[data['user'] == selected_user]
+@instrumented
+def month_activity_map(selected_user, data, index=None, start=None, end=None):
+    data, index = _window(data, index, start, end)
+    if index is not None:
+        return _sorted_counts(index.month[selected_user])
 
-    return data['month'].value_counts()
+    data = _user_data(selected_user, data)
+    return _observed(data['month'].value_counts())
 
 
-def most_busy_users(df):
-    temp = df[df['user'] != 'group_notification']
-    x = temp['user'].value_counts().head()
-    df = round((temp['user'].value_counts() / temp.shape[0]) * 100, 2).reset_index().rename(
+@instrumented
+def most_busy_users(df, index=None, start=None, end=None):
+    df, index = _window(df, index, start, end)
+    if index is not None:
+        # The index is built without group notifications
+        counts = index.user_counts
+    else:
+        temp = df[df['kind'] != MessageKind.SYSTEM]
+        counts = _observed(temp['user'].value_counts())
+    # Users with the same count are listed by name, whatever the dtype of the column
+    counts = _sorted_counts(counts.sort_index())
+    x = counts.head()
+    df = round((counts / counts.sum()) * 100, 2).reset_index().rename(
         columns={'index': 'name', 'user': 'percent'})
     df=df.rename(columns={'percent':'user','count':'percentage of usage'})
     return x,df
 
-def weekly_usage_analysis(selected_user, df):
-    st.title("Weekly Usage Analysis Chart")
-    user_df=df
-    # Filter the DataFrame for the selected user
-    if selected_user != 'Overall':
-        user_df = df[df['user'] == selected_user]
-
-    grouped_df = user_df.groupby(['day_name', 'period']).size().reset_index(name='message_count')
+def _turns(df, index=None):
+    # The turn table behind the conversation analytics, built once per index (or time window)
+    if index is not None:
+        return index.derived('turns', None, lambda: conversation.turns(index.data))
+    return conversation.turns(df[df['kind'] != MessageKind.SYSTEM])
+
+
+@instrumented
+def conversation_sessions(df, index=None, start=None, end=None):
+    # Bursts of messages separated by more than conversation.SESSION_GAP of silence
+    df, index = _window(df, index, start, end)
+    return conversation.sessions(_turns(df, index))
+
+
+@instrumented
+def reply_latency(df, index=None, start=None, end=None):
+    df, index = _window(df, index, start, end)
+    return conversation.reply_latency(_turns(df, index))
+
+
+@instrumented
+def reply_matrix(df, index=None, start=None, end=None):
+    # Who replies to whom, among the REPLY_MATRIX_USERS users with the most messages
+    df, index = _window(df, index, start, end)
+    turn_table = _turns(df, index)
+    busiest = turn_table['user'].value_counts().head(REPLY_MATRIX_USERS).index
+    return conversation.reply_matrix(turn_table, busiest)
+
+
+@instrumented
+def weekly_usage_heatmap(selected_user, df, index=None, start=None, end=None):
+    # Messages per day of the week (rows) and period of the day (columns)
+    df, index = _window(df, index, start, end)
+    if index is not None:
+        grouped_df = index.week_period[selected_user].reset_index(name='message_count')
+    else:
+        # Filter the DataFrame for the selected user
+        user_df = _user_data(selected_user, df)
+        grouped_df = user_df.groupby(['day_name', 'period'], observed=True).size().reset_index(name='message_count')
     grouped_df['period'] = grouped_df['period'].str.replace(' ', '')  # Remove spaces
-    heatmap_data = grouped_df.pivot_table(index='day_name', columns='period', values='message_count', aggfunc='sum').fillna(0)
-
-    col1, col2 = st.columns(2)
-
-    with col1:
-        st.subheader("Weekly Usage Chart")
-        st.write("")
-        st.dataframe(heatmap_data.style.background_gradient(cmap="Blues"), width=1000, use_container_width=False)
-    with col2:
-        fig = px.imshow(heatmap_data,color_continuous_scale="Blues")
-
-        # Customize the heatmap's appearance
-        fig.update_layout(title="Weekly Activity Heatmap",
-                    xaxis_title="Time of Day",
-                    yaxis_title="Day of Week",
-                    width=1000)
-         # Display the heatmap in Streamlit
-        st.plotly_chart(fig, use_container_width=True)
-
-def sentiment_analysis(selected_user, df):
-    st.title("Sentiment Analysis")
-    user_df=df
+    heatmap_data = grouped_df.pivot_table(index='day_name', columns='period', values='message_count', aggfunc='sum', observed=True).fillna(0)
+    return heatmap_data
+
+
+@instrumented
+def monthly_sentiment(selected_user, df, index=None, start=None, end=None):
+    # Messages per month and sentiment category, month formatted as "Jan 2023"
     # Filter the DataFrame for the selected user
-    if selected_user != 'Overall':
-        user_df = df[df['user'] == selected_user]
-
-    sentiment_counts = user_df.groupby('Sentiment').size().reset_index(name='Counts')
-
-    # Ensure 'date' column is in datetime format
-    # Convert 'date' column to datetime format
-    user_df['date'] = pd.to_datetime(user_df['date'], errors='coerce')
-
-    # Create a new column 'month_year' by extracting the month and year
-    user_df['month_year'] = user_df['date'].dt.to_period('M')
-
-    # Group by 'month_year' and 'Sentiment' and count the occurrences
-    sentiment_counts = user_df.groupby(['month_year', 'Sentiment']).size().reset_index(name='Counts')
-
-    # Use a lambda function to format 'month_year' as a string
-    sentiment_counts['month_year'] = sentiment_counts['month_year'].apply(lambda x: x.strftime('%b %Y'))
-
-    col1, col2 = st.columns(2)
-
-    with col1:
-        fig = px.pie(
-            names=sentiment_counts['Sentiment'],
-            values=sentiment_counts['Counts'],
-            title="Sentiment Distribution Monthly",
-            hole=0.5,
-            template="seaborn",
-        )
-
-        st.plotly_chart(fig, use_container_width=False)
-
-    with col2:
-        st.subheader("Message Sentiment Chart month-year wise")
-        st.dataframe(sentiment_counts.style.background_gradient(cmap="Blues"), use_container_width=True)
-    # Create a line chart for sentiment counts by formatted month and year
-    
-    fig = px.line(
-        sentiment_counts,
-        x='month_year',
-        y='Counts',
-        color='Sentiment',
-        title="Sentiment Counts by Month and Year",
-        labels={'Counts': 'Count'},
-        template="seaborn",
-    )
-
-    st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+    df, index = _window(df, index, start, end)
+    user_df = _user_data(selected_user, df, index)
+
+    # month_year and Sentiment are categoricals binned once per chat, so this is one groupby on
+    # their codes; month_year categories are in date order
+    sentiment_counts = user_df.groupby(['month_year', 'Sentiment'], observed=True).size().reset_index(name='Counts')
+    sentiment_counts['month_year'] = sentiment_counts['month_year'].astype(str)
+    sentiment_counts['Sentiment'] = sentiment_counts['Sentiment'].astype(str)
+    return sentiment_counts
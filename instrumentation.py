@@ -0,0 +1,172 @@
+import functools
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import pandas as pd
+
+# What app.py imports at start, then the analyzers it only loads when their section renders
+STARTUP_MODULES = ["streamlit", "pandas", "preprocessor", "helper", "sentiment", "cache", "store", "analysis_index", "rendering", "conversation", "binning"]
+LAZY_MODULES = ["plotly.express", "plotly.graph_objects", "urlextract", "wordcloud", "nltk.sentiment.vader", "emoji"]
+
+_importtime_line = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+# Run in the fresh interpreter: times each import statement, in order
+_timed_imports = """
+import importlib, json, sys, time
+times = []
+for module in sys.argv[1:]:
+    start = time.perf_counter()
+    importlib.import_module(module)
+    times.append((module, (time.perf_counter() - start) * 1000))
+print(json.dumps(times))
+"""
+
+
+def import_profile(modules=None):
+    # Imports the modules one after another in a fresh interpreter under `python -X importtime`,
+    # so nothing is cached yet. Returns the time each import added (a module already loaded by an
+    # earlier one adds little) and one row per module loaded with its self and cumulative time.
+    modules = modules or STARTUP_MODULES + LAZY_MODULES
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", _timed_imports] + modules,
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    added = pd.DataFrame(json.loads(result.stdout.strip().splitlines()[-1]), columns=["module", "added_ms"])
+    added["loaded"] = ["lazily" if module in LAZY_MODULES else "at start" for module in added["module"]]
+    rows = []
+    for line in result.stderr.splitlines():
+        match = _importtime_line.match(line)
+        if match:
+            rows.append((match.group(4), len(match.group(3)) // 2, int(match.group(1)) / 1000,
+                         int(match.group(2)) / 1000))
+    modules = pd.DataFrame(rows, columns=["module", "depth", "self_ms", "cumulative_ms"])
+    return added.round(1), modules.round(1)
+
+
+# Stage timings. A Recorder collects one record per stage run in the current context (a
+# Streamlit rerun, a batch job); without one, stage() and @instrumented cost a ContextVar lookup.
+RECORD_COLUMNS = ["stage", "depth", "parent", "rows", "start_ms", "wall_ms", "cpu_ms", "peak_mb", "error"]
+_recorder = ContextVar("instrumentation_recorder", default=None)
+# The stages open in this context, innermost last. A tuple, so contexts copied into worker
+# threads extend their own stack instead of sharing one list.
+_open_stages = ContextVar("instrumentation_open_stages", default=())
+
+
+class Recorder:
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.records = []
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def frame(self):
+        with self._lock:
+            records = list(self.records)
+        return pd.DataFrame(records, columns=RECORD_COLUMNS)
+
+    def to_json(self):
+        with self._lock:
+            return json.dumps(self.records, indent=1)
+
+
+def start_recording(trace_memory=False):
+    # Records the stages run from here on in the current context. Tracing memory starts
+    # tracemalloc for the rest of the process: it is global and slows every allocation down.
+    recorder = Recorder(trace_memory)
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _recorder.set(recorder)
+    _open_stages.set(())
+    return recorder
+
+
+def stop_recording():
+    recorder = _recorder.get()
+    _recorder.set(None)
+    return recorder
+
+
+@contextmanager
+def stage(name, rows=None):
+    # Times the block: wall and CPU time of this thread, and with memory tracing the peak traced
+    # memory above what was allocated on entry. Yields the record so the block can fill in rows.
+    # Nested stages are recorded too, with their depth and parent; peaks from other threads
+    # running at the same time are included, since tracemalloc is process wide.
+    recorder = _recorder.get()
+    record = {"stage": name, "rows": rows}
+    if recorder is None:
+        yield record
+        return
+
+    parents = _open_stages.get()
+    record.update(depth=len(parents), parent=parents[-1]["stage"] if parents else None, peak_mb=None, error=None)
+    tracing = recorder.trace_memory and tracemalloc.is_tracing()
+    peak = 0
+    if tracing:
+        # reset_peak() forgets the parent's peak so far, so hand it over first
+        if parents:
+            parents[-1]["_peak"] = max(parents[-1].get("_peak", 0), tracemalloc.get_traced_memory()[1])
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    token = _open_stages.set(parents + (record,))
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        record["start_ms"] = round((wall - recorder.started) * 1000, 1)
+        record["wall_ms"] = round((time.perf_counter() - wall) * 1000, 1)
+        record["cpu_ms"] = round((time.thread_time() - cpu) * 1000, 1)
+        _open_stages.reset(token)
+        if tracing:
+            peak = max(record.pop("_peak", 0), tracemalloc.get_traced_memory()[1])
+            record["peak_mb"] = round((peak - base) / 2 ** 20, 2)
+            if parents:
+                parents[-1]["_peak"] = max(parents[-1].get("_peak", 0), peak)
+        recorder.add(record)
+
+
+def _input_rows(args, kwargs):
+    for value in list(args) + list(kwargs.values()):
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            return len(value)
+    return None
+
+
+def instrumented(func):
+    # Runs every call of func as a stage named module.function, with the rows of its first
+    # DataFrame or Series argument
+    name = f"{func.__module__}.{func.__name__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _recorder.get() is None:
+            return func(*args, **kwargs)
+        with stage(name, _input_rows(args, kwargs)):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+if __name__ == "__main__":
+    added, modules = import_profile()
+    print(added.to_string(index=False))
+    print(f"\nat start: {added.loc[added['loaded'] == 'at start', 'added_ms'].sum():.0f} ms, "
+          f"lazily: {added.loc[added['loaded'] == 'lazily', 'added_ms'].sum():.0f} ms\n")
+    print("Slowest modules by self time:")
+    print(modules.sort_values("self_ms", ascending=False).head(15).to_string(index=False))
@@ -0,0 +1,95 @@
+import os
+
+import pandas as pd
+
+import preprocessor
+from instrumentation import instrumented
+
+# Several processed chats in one frame, told apart by a categorical chat_id. Every comparison
+# below is a single groupby over the combined frame, whatever the number of chats.
+
+
+def chat_names(file_names):
+    # Display names for the uploads: the file name without .txt, numbered when two are the same
+    names = []
+    for file_name in file_names:
+        name = base = os.path.splitext(os.path.basename(file_name))[0]
+        n = 2
+        while name in names:
+            name = f"{base} ({n})"
+            n += 1
+        names.append(name)
+    return names
+
+
+@instrumented
+def combine(frames):
+    # frames maps chat name -> processed chat. Group notifications are left out, as in the
+    # per-chat analysis.
+    parts = []
+    for name, df in frames.items():
+        part = df[df['kind'] != preprocessor.MessageKind.SYSTEM]
+        parts.append(part.assign(chat_id=name))
+    combined = pd.concat(parts, ignore_index=True)
+    # The user categories differ per chat, so the concatenation falls back to strings
+    combined = preprocessor.compact_schema(combined)
+    combined['chat_id'] = pd.Categorical(combined['chat_id'], categories=list(frames))
+    return combined
+
+
+@instrumented
+def chat_summary(combined):
+    frame = pd.DataFrame({
+        'chat_id': combined['chat_id'],
+        'user': combined['user'],
+        'date': combined['date'],
+        'media': combined['kind'] == preprocessor.MessageKind.MEDIA,
+        'words': combined['message'].str.split().str.len(),
+    })
+    return frame.groupby('chat_id', observed=True).agg(
+        messages=('user', 'size'), users=('user', 'nunique'), words=('words', 'sum'), media=('media', 'sum'),
+        first=('date', 'min'), last=('date', 'max'),
+    ).reset_index()
+
+
+def _months(combined):
+    return pd.to_datetime(combined['date']).dt.to_period('M').dt.to_timestamp().rename('month')
+
+
+@instrumented
+def daily_timeline(combined):
+    return combined.groupby(['chat_id', 'date'], observed=True).size().reset_index(name='message')
+
+
+@instrumented
+def monthly_timeline(combined):
+    return combined.groupby([combined['chat_id'], _months(combined)], observed=True).size().reset_index(name='message')
+
+
+@instrumented
+def busiest_users(combined, top=5):
+    # The top users of every chat with their share of its messages
+    counts = combined.groupby(['chat_id', 'user'], observed=True).size()
+    percent = (counts / counts.groupby(level='chat_id', observed=True).transform('sum') * 100).round(2)
+    table = pd.DataFrame({'message': counts, 'percent': percent}).reset_index()
+    table = table.sort_values(['chat_id', 'message'], ascending=[True, False], kind='stable')
+    return table.groupby('chat_id', observed=True).head(top).reset_index(drop=True)
+
+
+@instrumented
+def weekly_usage(combined):
+    # Messages per chat, day of the week and period of the day
+    return combined.groupby(['chat_id', 'day_name', 'period'], observed=True).size().reset_index(name='message_count')
+
+
+@instrumented
+def monthly_sentiment(combined):
+    return combined.groupby([combined['chat_id'], _months(combined), 'Sentiment'],
+                            observed=True).size().reset_index(name='Counts')
+
+
+def shares(table, column, values):
+    # chat_id x column table of the percentage of each chat's values, for comparing chats of
+    # different sizes
+    counts = table.pivot_table(index='chat_id', columns=column, values=values, aggfunc='sum', observed=True).fillna(0)
+    return counts.div(counts.sum(axis=1), axis=0).mul(100).round(1)
@@ -1,6 +1,50 @@
+import calendar
+import enum
+import io
+import itertools
 import re
+import sys
+import numpy as np
 import pandas as pd
 
+import binning
+import dialects
+from instrumentation import instrumented
+
+# "name: text" anchored at the start of the first line, so it never backtracks across the
+# message body; rows without a name are group notifications
+user_message_pattern = re.compile(r"\A(?P<user>[^\n]+?):\s(?P<message>[\w\W]*)")
+# Phrases of system events. A "name" containing one is an event with a ": " further on, like
+# '~ Admin changed the subject to "Batch: 2023"', not a user.
+system_event_pattern = re.compile(
+    r"end-to-end encrypted| created (?:group|this group)| added | removed | left$| joined using "
+    r"| changed (?:the|this|their|to) | deleted this group's|(?: is| are|'re|’re) now an admin| turned (?:on|off) "
+)
+# Placeholders of media left out of the export (Android, then iOS). iOS puts a file name in front
+# of "document omitted" and the like, always ending in a U+200E mark; without the mark, a text
+# ending in "video omitted" is just text.
+media_pattern = re.compile(
+    r"<Media omitted>|<attached: [^>]+>|(?:.*\u200e)?(?:image|video|audio|sticker|GIF|document|Contact card) omitted"
+)
+DELETED_MESSAGES = frozenset(["This message was deleted", "This message was deleted.", "You deleted this message",
+                              "You deleted this message."])
+
+
+class MessageKind(enum.IntEnum):
+    # Stored as int8 in the 'kind' column
+    TEXT = 0
+    MEDIA = 1
+    DELETED = 2
+    SYSTEM = 3
+
+
+# Category sets of the compact schema. They are kept in lexical order so that groupbys and
+# sorts come out in the same order as with the plain string columns. month_year is the
+# exception: its categories are in date order (see binning.month_labels).
+MONTHS = sorted(calendar.month_name[1:])
+DAY_NAMES = sorted(calendar.day_name)
+PERIODS = sorted(["Late Night", "Early Morning", "Morning", "Afternoon", "Evening", "Night"])
+
 def get_time_slot(hour):
     if 0 <= hour < 4:
         return "Late Night"
@@ -14,45 +58,134 @@ def get_time_slot(hour):
         return "Evening"
     else:
         return "Night"
-def preprocess(data):
-    dissision_pattern = "\d{1,2}:\d{2}\s[AaPp][Mm]"
-    dission = len(re.findall(dissision_pattern, data))
-
-    if dission >= 3:
-        pattern = "\d{1,2}/\d{1,2}/\d{2,4},\s\d{1,2}:\d{2}\s[AaPp][Mm]\s-\s"
-        pattern1 = "\d{1,2}/\d{1,2}/\d{2,4},\s\d{1,2}:\d{2}\s[AaPp][Mm]"
-        messages = re.split(pattern, data)[1:]
-        dates = re.findall(pattern1, data)
-
-        df = pd.DataFrame({"user_message": messages, "date": dates})
-        df["date"] = pd.to_datetime(df["date"], format="%d/%m/%y, %I:%M %p")  # Updated format
-        df = df[["date", "user_message"]]
+
+
+def message_kind(message):
+    text = message.strip().lstrip('\u200e')
+    if text in DELETED_MESSAGES:
+        return MessageKind.DELETED
+    if text.endswith(('omitted', '>')) and media_pattern.fullmatch(text):
+        return MessageKind.MEDIA
+    return MessageKind.TEXT
+
+
+def _messages(lines, header):
+    # The state machine: a line starting with a header opens a message, any other line continues
+    # the open one. Yields (timestamp, body) with continuation lines joined by "\n" and no line
+    # ends at the end; lines before the first header are dropped.
+    timestamp = None
+    body = []
+    for line in lines:
+        line = line.rstrip('\r\n')
+        match = header.match(line)
+        if match is None:
+            if timestamp is not None:
+                body.append(line)
+            continue
+        if timestamp is not None:
+            yield timestamp, "\n".join(body).rstrip("\n")
+        timestamp = match.group(1)
+        body = [line[match.end():]]
+    if timestamp is not None:
+        yield timestamp, "\n".join(body).rstrip("\n")
+
+
+def _classify(body):
+    # (user, message, kind) of a message body. User names are interned: a chat has a few hundred
+    # of them repeated over every row. iOS sends system events as "<group name>: \u200e<event>".
+    match = user_message_pattern.match(body)
+    if match is None or system_event_pattern.search(match.group('user')):
+        return 'group_notification', body, MessageKind.SYSTEM
+    message = match.group('message')
+    if message.startswith('\u200e') and system_event_pattern.search(message.strip().lstrip('\u200e')):
+        return 'group_notification', body, MessageKind.SYSTEM
+    return sys.intern(match.group('user')), message, message_kind(message)
+
+
+def _parse(lines, dialect, chunk_size=None, compact=False, settle=False):
+    # Frames of at most chunk_size messages (all of them without one), from a single pass over
+    # the lines. With settle, the messages up to the first date that gives the day/month order
+    # away are read ahead and the dialect fixed from it before the first frame is built.
+    parsed = _messages(lines, dialect.header)
+    if settle:
+        ahead = []
+        for message in parsed:
+            ahead.append(message)
+            if dialects.date_order(message[0]) is not None:
+                break
+        dialect = dialects.settle_dialect(dialect, [timestamp for timestamp, _ in ahead[-1:]])
+        parsed = itertools.chain(ahead, parsed)
+
+    dates, users, messages, kinds = [], [], [], []
+    start = 0
+    for timestamp, body in parsed:
+        user, message, kind = _classify(body)
+        dates.append(timestamp)
+        users.append(user)
+        messages.append(message)
+        kinds.append(kind)
+        if chunk_size and len(dates) >= chunk_size:
+            yield _chunk_frame(dialect, dates, users, messages, kinds, start, compact)
+            start += len(dates)
+            dates, users, messages, kinds = [], [], [], []
+    if dates or not start:
+        yield _chunk_frame(dialect, dates, users, messages, kinds, start, compact)
+
+
+@instrumented
+def preprocess(data, dialect=None, compact=False):
+    # Pick the export dialect from the first few KB, then parse the lines in one pass. A leading
+    # BOM would keep the first header from matching, as in _iter_lines.
+    data = data.lstrip('\ufeff')
+    settle = dialect is None
+    if settle:
+        dialect = dialects.detect_dialect(data[:dialects.SAMPLE_SIZE])
+    return next(_parse(io.StringIO(data, newline='\n'), dialect, compact=compact, settle=settle))
+
+
+def _string_dtype():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return object
+    return pd.StringDtype("pyarrow")
+
+
+@instrumented
+def compact_schema(df):
+    # Categoricals for the low-cardinality columns, small integers for the calendar fields,
+    # datetime64 dates and Arrow-backed message strings (when pyarrow is installed). Also accepts
+    # an already compact frame, e.g. the concatenated chunks of preprocess_stream(compact=True).
+    df = df.copy(deep=False)
+    df['user'] = df['user'].astype('category')
+    df['message'] = df['message'].astype(_string_dtype())
+    df['month'] = pd.Categorical(df['month'], categories=MONTHS)
+    df['day_name'] = pd.Categorical(df['day_name'], categories=DAY_NAMES)
+    df['period'] = pd.Categorical(df['period'], categories=PERIODS)
+    df['year'] = df['year'].astype('int16')
+    for column in ('day', 'hour', 'minute'):
+        df[column] = df[column].astype('int8')
+    if 'timestamp' in df:
+        df['date'] = df['timestamp'].dt.normalize()
+        # Concatenated chunks each had their own months
+        df['month_year'] = binning.month_labels(df['timestamp'])
     else:
-        pattern = '\d{1,2}/\d{1,2}/\d{2,4},\s\d{1,2}:\d{2}\s-\s'
-        messages = re.split(pattern, data)[1:]
-        dates = re.findall(pattern, data)
-
-        df = pd.DataFrame({'user_message': messages, 'date': dates})
-        # Convert message_date type
-        df['date'] = pd.to_datetime(df['date'], format='%d/%m/%y, %H:%M - ')  # Updated format
-
-        df = df[["date", "user_message"]]
-
-    users = []
-    messages = []
-    for message in df['user_message']:
-        entry = re.split('([\w\W]+?):\s', message)
-        if entry[1:]:  # User name
-            users.append(entry[1])
-            messages.append(" ".join(entry[2:]))
-        else:
-            users.append('group_notification')
-            messages.append(entry[0])
-
-    df['user'] = users
-    df['message'] = messages
-    df.drop(columns=['user_message'], inplace=True)
+        df['date'] = pd.to_datetime(df['date'])
+    return df
 
+
+def memory_report(before, after):
+    # Deep memory use per column of two versions of the same frame, in bytes
+    report = pd.DataFrame({
+        'before': before.memory_usage(deep=True, index=False),
+        'after': after.memory_usage(deep=True, index=False),
+    })
+    report.loc['total'] = report.sum()
+    report['ratio'] = (report['before'] / report['after']).round(1)
+    return report
+
+
+def _date_columns(df):
     df['only_date'] = df['date'].dt.date
     df['year'] = df['date'].dt.year
     df['month'] = df['date'].dt.month_name()
@@ -60,8 +193,9 @@ def preprocess(data):
     df['day_name'] = df['date'].dt.day_name()
     df['hour'] = df['date'].dt.hour
     df['minute'] = df['date'].dt.minute
+    timestamp = df['date']
     df = df.drop(columns="date")
-    
+
     # period = []
     # for hour in df[['day_name', 'hour']]['hour']:
     #     if hour == 23:
@@ -71,7 +205,68 @@ def preprocess(data):
     #     else:
     #         period.append(str(hour) + ":" + str(hour + 1))
     df = df.rename(columns={'only_date': 'date'})
-    df['period'] = df['hour'].apply(get_time_slot)
-    df['period'] = df['period'].astype(str)  # Change the 'period' column to string data type with colons
+    # Binned once here for every hour and month, not per row or per chart
+    df['period'] = binning.time_slots(df['hour'])
+    df['month_year'] = binning.month_labels(timestamp)
+    # The full datetime64 timestamp as well, for time-window queries (analysis_index.time_slice)
+    df['timestamp'] = timestamp
 
     return df
+
+
+def _iter_lines(source):
+    # Accepts a path, a text file or a binary file (e.g. Streamlit's UploadedFile)
+    if isinstance(source, str):
+        with open(source, 'r', encoding='utf-8-sig', newline='\n') as f:
+            yield from f
+        return
+    if isinstance(source, io.TextIOBase):
+        first = True
+        for line in source:
+            if first:
+                line = line.lstrip('\ufeff')
+                first = False
+            yield line
+        return
+    # Lines end at "\n" only, as in preprocess()
+    text = io.TextIOWrapper(source, encoding='utf-8-sig', newline='\n')
+    try:
+        yield from text
+    finally:
+        # Don't close the caller's file together with the wrapper
+        text.detach()
+
+
+def _chunk_frame(dialect, dates, users, messages, kinds, start, compact):
+    df = pd.DataFrame({
+        'date': dialects.parse_timestamps(dialect, dates),
+        'user': users,
+        'message': messages,
+        'kind': np.array(kinds, dtype=np.int8),
+    })
+    df = _date_columns(df)
+    if compact:
+        df = compact_schema(df)
+    df.index = pd.RangeIndex(start, start + len(df))
+    return df
+
+
+def preprocess_stream(source, chunk_size=50000, compact=False):
+    # Reads the export line by line and yields DataFrames of at most chunk_size messages, with
+    # the same columns as preprocess(). Only the current chunk is held in memory, so
+    # pd.concat(preprocess_stream(f)) peaks at roughly the size of the final frame. Compact
+    # chunks each have their own user categories; run compact_schema() on the concatenation.
+    lines = _iter_lines(source)
+
+    # The dialect is detected from the first few KB, which are then replayed
+    sample = []
+    sample_size = 0
+    for line in lines:
+        sample.append(line)
+        sample_size += len(line)
+        if sample_size >= dialects.SAMPLE_SIZE:
+            break
+    if not sample:
+        return
+    dialect = dialects.detect_dialect("".join(sample))
+    yield from _parse(itertools.chain(sample, lines), dialect, chunk_size, compact, settle=True)
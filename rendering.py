@@ -0,0 +1,73 @@
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+# What the browser gets, whatever the size of the chat: time series are downsampled to at most
+# MAX_CHART_POINTS points and raw tables are sent PAGE_ROWS rows at a time
+MAX_CHART_POINTS = int(os.environ.get("WA_MAX_CHART_POINTS", "1500"))
+PAGE_ROWS = int(os.environ.get("WA_PAGE_ROWS", "1000"))
+
+
+def lttb(x, y, threshold):
+    # Positions of the points kept by Largest-Triangle-Three-Buckets: the first and last point,
+    # plus from each of threshold - 2 buckets the point forming the largest triangle with the
+    # point kept before it and the mean of the next bucket. Spikes and dips survive, unlike with
+    # plain striding.
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    keep = np.empty(threshold, dtype=np.intp)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        mean_x, mean_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        area = np.abs((x[a] - mean_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (mean_y - y[a]))
+        a = start + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+
+def downsample(frame, x, y, max_points=MAX_CHART_POINTS):
+    # frame sorted by x, cut down to max_points rows with LTTB
+    if len(frame) <= max_points:
+        return frame
+    x_values = frame[x]
+    if not pd.api.types.is_numeric_dtype(x_values):
+        x_values = pd.to_datetime(x_values).astype("int64")
+    return frame.iloc[lttb(x_values.to_numpy(), frame[y].to_numpy(), max_points)]
+
+
+def page_count(rows, page_rows=PAGE_ROWS):
+    return max(1, math.ceil(rows / page_rows))
+
+
+def column_ranges(df):
+    # (min, max) of the columns background_gradient colours, over the whole frame
+    numeric = df.select_dtypes(include=np.number)
+    return {column: (numeric[column].min(), numeric[column].max()) for column in numeric
+            if numeric[column].notna().any()}
+
+
+def styled_page(df, page, ranges, page_rows=PAGE_ROWS, cmap="Blues"):
+    # One page of df with the same colours df.style.background_gradient() gives it on the full
+    # frame, styling only the rows that are sent
+    view = df.iloc[page * page_rows:(page + 1) * page_rows]
+    styler = view.style
+    for column, (low, high) in ranges.items():
+        styler = styler.background_gradient(cmap=cmap, subset=[column], vmin=low, vmax=high)
+    return styler
+
+
+def downsample_groups(frame, by, x, y, max_points=MAX_CHART_POINTS):
+    # downsample() for each line of a multi-line chart, sharing the point budget between them
+    groups = frame.groupby(by, observed=True)
+    per_group = max(3, max_points // max(groups.ngroups, 1))
+    return pd.concat([downsample(group, x, y, per_group) for _, group in groups], ignore_index=True)
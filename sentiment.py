@@ -0,0 +1,139 @@
+import hashlib
+import multiprocessing
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import pandas as pd
+
+from instrumentation import instrumented
+from preprocessor import MessageKind
+
+# Scores are cached on disk keyed by a hash of the message text, so re-uploads and reruns only
+# score messages that were never seen before
+CACHE_PATH = os.environ.get(
+    "WA_SENTIMENT_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "whatsapp-analyzer", "sentiment.sqlite"),
+)
+# Part of every cache key; bump it when the scorer or its lexicon changes
+SCORER_VERSION = b"vader-1"
+BATCH_SIZE = 2000
+# Below this many new messages scoring inline is faster than starting a process pool
+POOL_THRESHOLD = 20000
+SQLITE_MAX_VARIABLES = 500
+# A vendored nltk_data directory is searched before nltk's default locations, so offline
+# containers never need the downloader:  python -m nltk.downloader -d nltk_data vader_lexicon
+NLTK_DATA = os.environ.get("WA_NLTK_DATA", os.path.join(os.path.dirname(os.path.abspath(__file__)), "nltk_data"))
+
+_analyzer = None
+
+
+@lru_cache(maxsize=None)
+def ensure_lexicon():
+    # Resolved once per process; downloads the lexicon only when no search path has it
+    import nltk
+
+    if os.path.isdir(NLTK_DATA) and NLTK_DATA not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DATA)
+    try:
+        nltk.data.find("sentiment/vader_lexicon.zip")
+    except LookupError:
+        nltk.download("vader_lexicon", quiet=True)
+
+
+def _get_analyzer():
+    global _analyzer
+    if _analyzer is None:
+        ensure_lexicon()
+        from nltk.sentiment.vader import SentimentIntensityAnalyzer
+        _analyzer = SentimentIntensityAnalyzer()
+    return _analyzer
+
+
+def _score_batch(messages):
+    analyzer = _get_analyzer()
+    return [analyzer.polarity_scores(message)["compound"] for message in messages]
+
+
+def message_key(message):
+    return hashlib.blake2b(message.encode("utf-8"), digest_size=16, key=SCORER_VERSION).digest()
+
+
+def _connect(cache_path):
+    os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+    connection = sqlite3.connect(cache_path, timeout=30)
+    connection.execute("CREATE TABLE IF NOT EXISTS scores (key BLOB PRIMARY KEY, score REAL NOT NULL)")
+    return connection
+
+
+def _load_cached(connection, keys):
+    cached = {}
+    for i in range(0, len(keys), SQLITE_MAX_VARIABLES):
+        batch = keys[i:i + SQLITE_MAX_VARIABLES]
+        placeholders = ",".join("?" * len(batch))
+        cached.update(connection.execute(f"SELECT key, score FROM scores WHERE key IN ({placeholders})", batch))
+    return cached
+
+
+def score_texts(texts, workers=None):
+    # Scores a list of distinct texts, in a process pool once there are enough of them
+    if workers == 1 or len(texts) < POOL_THRESHOLD:
+        return _score_batch(texts)
+    batches = [texts[i:i + BATCH_SIZE] for i in range(0, len(texts), BATCH_SIZE)]
+    scores = []
+    # Spawned, not forked: this runs next to the Streamlit server's threads and the analysis
+    # pool, and forking a multi-threaded process can leave a lock held forever in the child
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        for batch_scores in pool.map(_score_batch, batches):
+            scores.extend(batch_scores)
+    return scores
+
+
+# Map VADER sentiment score to sentiment categories
+
+def map_sentiment(score):
+    if score >= 0.5:
+        return "Very Positive"
+    elif score >= 0.1:
+        return "Positive"
+    elif score >= -0.1:
+        return "Neutral"
+    elif score >= -0.5:
+        return "Negative"
+    else:
+        return "Very Negative"
+
+
+def skipped_rows(df):
+    # Media placeholders, deleted messages and system notifications carry no sentiment
+    return df["kind"] != MessageKind.TEXT
+
+
+@instrumented
+def compound_scores(df, workers=None, cache_path=CACHE_PATH):
+    # VADER compound score for every row of a preprocessed frame. Identical messages are scored
+    # once, skipped rows get 0.0 (Neutral).
+    skipped = skipped_rows(df)
+    texts = pd.unique(df.loc[~skipped, "message"]).tolist()
+    keys = [message_key(text) for text in texts]
+
+    connection = _connect(cache_path) if cache_path else None
+    try:
+        cached = _load_cached(connection, keys) if connection is not None else {}
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        new_scores = score_texts([texts[i] for i in missing], workers=workers)
+        for i, score in zip(missing, new_scores):
+            cached[keys[i]] = score
+        if connection is not None and missing:
+            with connection:
+                connection.executemany("INSERT OR REPLACE INTO scores (key, score) VALUES (?, ?)",
+                                       [(keys[i], score) for i, score in zip(missing, new_scores)])
+    finally:
+        if connection is not None:
+            connection.close()
+
+    by_text = {text: cached[key] for text, key in zip(texts, keys)}
+    scores = pd.Series(0.0, index=df.index)
+    scores.loc[~skipped] = df.loc[~skipped, "message"].map(by_text).astype(float)
+    return scores
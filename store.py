@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import re
+
+import pandas as pd
+
+import binning
+import dialects
+import preprocessor
+import sentiment
+from instrumentation import instrumented
+
+# Processed chats are kept here as Parquet, one file per chat name, next to a small JSON file
+# describing the last message that was ingested
+STORE_DIR = os.environ.get(
+    "WA_STORE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "whatsapp-analyzer", "chats"),
+)
+# Bump when the stored columns change; older stores are then rebuilt from scratch
+SCHEMA_VERSION = 5
+
+
+def _paths(name, store_dir):
+    digest = hashlib.blake2b(name.encode("utf-8"), digest_size=6).hexdigest()
+    stem = re.sub(r"[^\w.-]+", "_", os.path.splitext(os.path.basename(name))[0])[:80] + "-" + digest
+    return os.path.join(store_dir, stem + ".parquet"), os.path.join(store_dir, stem + ".json")
+
+
+def _block_hash(block):
+    return hashlib.blake2b(block, digest_size=16).hexdigest()
+
+
+def _load_meta(meta_path):
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("schema") != SCHEMA_VERSION or meta.get("dialect") not in dialects.DIALECTS:
+        return None
+    return meta
+
+
+def _stored_meta(meta_path, compact):
+    meta = _load_meta(meta_path)
+    if meta is None or meta.get("compact", False) != compact:
+        return None
+    return meta
+
+
+def _find_tail(raw, meta):
+    # Byte offset of the last ingested message in a new export of the same chat, found by
+    # searching backwards for its header and checking the hash of the whole message
+    header = meta["last_header"].encode("utf-8")
+    size = meta["last_size"]
+    end = len(raw)
+    while True:
+        pos = raw.rfind(header, 0, end)
+        if pos < 0:
+            return None
+        block_end = pos + size
+        if (_block_hash(raw[pos:block_end]) == meta["last_hash"]
+                and (block_end == len(raw) or raw[block_end:block_end + 1] in (b"\n", b"\r"))):
+            return pos
+        end = pos
+
+
+def _last_message(text, dialect):
+    last = None
+    for last in dialect.header.finditer(text):
+        pass
+    if last is None:
+        return None
+    block = text[last.start():].rstrip().encode("utf-8")
+    return {"last_header": last.group(0), "last_hash": _block_hash(block), "last_size": len(block)}
+
+
+@instrumented
+def ingest(name, raw, store_dir=STORE_DIR, compact=False):
+    # Returns the processed chat for an export (raw bytes) and how many messages were new. If a
+    # previous export of the same chat name is stored and its last message is found in raw, only
+    # the text from that message on is parsed and scored; otherwise the whole export is. The last
+    # stored message is parsed again since it may have been cut short in the older export.
+    parquet_path, meta_path = _paths(name, store_dir)
+    meta = _stored_meta(meta_path, compact)
+
+    stored = None
+    start = None
+    if meta is not None and os.path.exists(parquet_path):
+        start = _find_tail(raw, meta)
+        if start is not None:
+            stored = pd.read_parquet(parquet_path).iloc[:-1]
+
+    if stored is not None:
+        text = raw[start:].decode("utf-8")
+        dialect = dialects.DIALECTS[meta["dialect"]]
+        try:
+            new = preprocessor.preprocess(text, dialect=dialect, compact=compact)
+        except ValueError:
+            # The new messages contradict the day/month order taken for the stored ones (whose
+            # dates were all 12 or below), so the whole export is processed again
+            stored = None
+    if stored is None:
+        text = raw.decode("utf-8-sig")
+        dialect = dialects.detect_dialect(text[:dialects.SAMPLE_SIZE])
+        # Settled here rather than in preprocess() so that the stored dialect is the one used
+        dialect = dialects.settle_dialect(dialect, (match.group(1) for match in dialect.header.finditer(text)))
+        new = preprocessor.preprocess(text, dialect=dialect, compact=compact)
+    new["Sentiment Score"] = sentiment.compound_scores(new)
+
+    if stored is None:
+        df = new
+    else:
+        df = pd.concat([stored, new], ignore_index=True)
+        if compact:
+            # The user categories of the two parts differ, so the concatenation falls back to strings
+            df = preprocessor.compact_schema(df)
+        else:
+            df['month_year'] = binning.month_labels(df['timestamp'])
+        if len(new) <= 1:
+            # Only the last stored message again, nothing to write
+            return df, 0
+
+    last = _last_message(text, dialect)
+    os.makedirs(store_dir, exist_ok=True)
+    df.to_parquet(parquet_path, index=False)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(dict(last, schema=SCHEMA_VERSION, dialect=dialect.name, compact=compact, rows=len(df)), f)
+    return df, len(new) if stored is None else len(new) - 1
+
+
+def load(name, store_dir=STORE_DIR, compact=False):
+    parquet_path, meta_path = _paths(name, store_dir)
+    if _stored_meta(meta_path, compact) is None or not os.path.exists(parquet_path):
+        return None
+    return pd.read_parquet(parquet_path)
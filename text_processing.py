@@ -0,0 +1,84 @@
+import os
+import string
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from preprocessor import MessageKind
+
+STOP_WORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stop_hinglish.txt')
+
+
+@lru_cache(maxsize=None)
+def stop_words():
+    # Loaded once per process; membership is an exact word match, not a substring search
+    with open(STOP_WORDS_PATH, 'r', encoding='utf-8') as f:
+        return frozenset(word.strip() for word in f.read().splitlines() if word.strip())
+
+
+def analysable_messages(data):
+    # Text written by users: no group notifications, media placeholders or deleted messages
+    return data.loc[data['kind'] == MessageKind.TEXT, 'message']
+
+
+def word_counts(messages):
+    # Lower-cased whitespace tokens minus stop words, most frequent first. The column is joined and
+    # split once in C instead of per message; ties keep the order of first appearance, like
+    # Counter.most_common().
+    tokens = pd.Series(" ".join(messages).lower().split(), dtype=object)
+    tokens = tokens[~tokens.isin(stop_words())]
+    counts = tokens.value_counts(sort=False).sort_values(ascending=False, kind='stable')
+    counts.index.name = 'word'
+    return counts
+
+
+def bigram_counts(messages):
+    # Adjacent word pairs of the joined messages, as WordCloud finds them for collocations: pairs
+    # are taken before stop words are dropped and neither word may be one
+    tokens = pd.Series(" ".join(messages).lower().split(), dtype=object).str.strip(string.punctuation)
+    tokens = tokens[tokens != ''].to_numpy()
+    stop = pd.Series(tokens, dtype=object).isin(stop_words()).to_numpy()
+    keep = ~stop[:-1] & ~stop[1:]
+    pairs = pd.Series(tokens[:-1][keep], dtype=object) + " " + tokens[1:][keep]
+    counts = pairs.value_counts(sort=False)
+    counts.index.name = 'bigram'
+    return counts
+
+
+def _likelihood(k, n, x):
+    return np.log(np.maximum(x, 1e-10)) * k + np.log(np.maximum(1 - x, 1e-10)) * (n - k)
+
+
+def collocation_scores(count_bigram, count1, count2, n_words):
+    # Dunning's likelihood ratio, as wordcloud.tokenization.score() computes it for one bigram
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = count2 / n_words
+        p1 = count_bigram / count1
+        p2 = (count2 - count_bigram) / (n_words - count1)
+        score = (_likelihood(count_bigram, count1, p) + _likelihood(count2 - count_bigram, n_words - count1, p)
+                 - _likelihood(count_bigram, count1, p1) - _likelihood(count2 - count_bigram, n_words - count1, p2))
+    return np.where((n_words <= count1) | (n_words <= count2), 0, -2 * score)
+
+
+def cloud_frequencies(counts, bigrams=None, collocation_threshold=30):
+    # Folds punctuation into the neighbouring word ("hello," -> "hello") the way WordCloud's own
+    # tokenizer would; works on the distinct tokens only, not on the text. With bigram counts,
+    # pairs scoring above the threshold are added as "word word" and taken off the counts of their
+    # words, like WordCloud(collocations=True).generate() does.
+    words = counts.index.str.strip(string.punctuation)
+    keep = (words != '') & ~words.isin(stop_words())
+    unigrams = counts[keep].groupby(words[keep]).sum()
+    if bigrams is None or bigrams.empty or unigrams.empty:
+        return unigrams.to_dict()
+
+    pairs = bigrams.index.str.split(" ", n=1)
+    first, second = pairs.str[0], pairs.str[1]
+    scores = collocation_scores(bigrams.to_numpy(dtype=float), unigrams.reindex(first).to_numpy(dtype=float),
+                                unigrams.reindex(second).to_numpy(dtype=float), float(unigrams.sum()))
+    chosen = scores > collocation_threshold
+    collocations = bigrams[chosen]
+    discount = (collocations.groupby(first[chosen]).sum()
+                .add(collocations.groupby(second[chosen]).sum(), fill_value=0))
+    frequencies = pd.concat([unigrams.sub(discount, fill_value=0), collocations])
+    return frequencies[frequencies > 0].to_dict()